@@ -107,7 +107,7 @@ resource "google_bigquery_routine" "dwh-load-bq-remote-fnc-0" {
   })
 
   remote_function_options {
-    max_batching_rows = "10"
+    max_batching_rows = "50"
     endpoint          = module.load-0-api-fnc.uri
     connection        = google_bigquery_connection.load-connection-bq-0.name
   }
@@ -145,6 +145,12 @@ resource "google_project_iam_member" "load-0-api-fnc-runner-sa-iam" {
   member  = "serviceAccount:${google_service_account.load-0-api-fnc-runner-sa.email}"
 }
 
+# Large API responses are offloaded by the api-connector to the staging bucket
+resource "google_storage_bucket_iam_member" "load-0-api-fnc-runner-sa-staging" {
+  bucket = module.load-cs-df-0.name
+  role   = "roles/storage.objectCreator"
+  member = "serviceAccount:${google_service_account.load-0-api-fnc-runner-sa.email}"
+}
 
 resource "google_service_account" "load-0-api-fnc-invoker-sa" {
   project      = module.load-project.project_id
@@ -171,8 +177,15 @@ resource "google_storage_bucket_object" "load-config-for-templated-dag" {
   content_type = "application/json; charset=UTF-8"
 }
 
+locals {
+  # Requests served at once by each api-connector instance (Cloud Run concurrency). Every
+  # in-flight request keeps up to RESPONSE_SPOOL_SIZE (1 MiB) of response body in memory,
+  # so the function's memory is raised with it.
+  api_fnc_concurrency = 40
+}
+
 module "load-0-api-fnc" {
-  depends_on = [module.load-project, google_service_account.load-0-api-fnc-runner-sa]
+  depends_on = [module.load-project, google_service_account.load-0-api-fnc-runner-sa, module.load-cs-df-0]
 
   source           = "github.com/GoogleCloudPlatform/cloud-foundation-fabric//modules/cloud-function-v2?ref=v36.0.1"
   project_id       = module.load-project.project_id
@@ -196,8 +209,8 @@ module "load-0-api-fnc" {
   function_config = {
     entry_point    = "main"
     instance_count = 100
-    cpu            = 1
-    memory         = 128
+    cpu            = 1 # Concurrency above 1 requires at least one CPU
+    memory         = 512
     runtime        = "python310"
     timeout        = 480 # Timeout in seconds, increase it if your CF timeouts.
   }
@@ -206,6 +219,9 @@ module "load-0-api-fnc" {
     PROJECT_ID      = module.load-project.project_id
     FUNCTION_NAME   = "load-0-api-fnc"
     REGION          = local.config.region
+    LOD_GCS_STAGING = module.load-cs-df-0.url
+    # functions-framework serves with (CPUs x 4) gunicorn threads unless THREADS is set
+    THREADS = local.api_fnc_concurrency
     PUBSUB_TOPICS = jsonencode([for ps in module.transf-ps-0 : {
       replace(replace(ps.topic.name, "${local.config.resource-prefix}-", ""), "-trf-ps-0", "") = ps.topic.id
     }])
@@ -214,3 +230,14 @@ module "load-0-api-fnc" {
   service_account        = google_service_account.load-0-api-fnc-runner-sa.email
   service_account_create = false
 }
+
+# The function module doesn't expose max_instance_request_concurrency, and each deployment
+# of the function resets its Cloud Run service to one request at a time: set it after every apply.
+resource "terraform_data" "load-0-api-fnc-concurrency" {
+  depends_on       = [module.load-0-api-fnc]
+  triggers_replace = [timestamp()]
+
+  provisioner "local-exec" {
+    command = "gcloud run services update load-0-api-fnc --project ${module.load-project.project_id} --region ${local.config.region} --concurrency ${local.api_fnc_concurrency} --quiet"
+  }
+}
@@ -17,21 +17,22 @@ import uuid
 import datetime
 import json
 import logging
-import pendulum
-from airflow.sensors.time_delta import TimeDeltaSensor, TimeDeltaSensorAsync
+import re
 
 from airflow import DAG
 
 # from airflow.providers.google.cloud.operators.dataform import DataformRunOperator
 from airflow.providers.google.cloud.operators.bigquery import  BigQueryInsertJobOperator, BigQueryCreateEmptyTableOperator, BigQueryDeleteTableOperator, BigQueryUpdateTableOperator
 from airflow.providers.google.cloud.transfers.gcs_to_bigquery import GCSToBigQueryOperator
+from airflow.providers.google.cloud.hooks.bigquery import BigQueryHook
 from airflow.operators.python import PythonOperator
-from airflow.providers.google.cloud.sensors.tasks import TaskQueueEmptySensor
+from airflow.providers.google.cloud.hooks.tasks import CloudTasksHook
+from airflow.sensors.python import PythonSensor
 from airflow.providers.google.cloud.operators.tasks import CloudTasksQueueCreateOperator, CloudTasksQueueDeleteOperator
 from airflow.operators.dummy import DummyOperator
 
 
-from google.cloud.tasks_v2.types import Queue
+from google.cloud.tasks_v2.types import Queue, RateLimits, RetryConfig
 
 logger = logging.getLogger(__name__)
 
@@ -75,14 +76,51 @@ dynamic_body = request_config.get('dynamic_data',{}).get('body', {})
 request_config.pop('dynamic_data',None)
 request_config.pop('static_data',None)
 
+# In direct mode the api-connector calls the API from the BigQuery job itself, without a Cloud Tasks queue
+direct_dispatch = api_config.get('dispatch_mode') == 'direct'
+
+def build_task_queue():
+    # max_dispatch/max_concurrent bound how fast Cloud Tasks calls the api-connector for this
+    # workflow. max_burst is output-only in Cloud Tasks, so it is enforced by the connector.
+    rate_limits = {}
+    if request_config.get('max_dispatch'):
+        rate_limits['max_dispatches_per_second'] = float(request_config['max_dispatch'])
+    if request_config.get('max_concurrent'):
+        rate_limits['max_concurrent_dispatches'] = int(request_config['max_concurrent'])
+
+    # Task retries have their own settings: the connector retries API calls itself (see `retry`),
+    # and each task rerun starts those retries over
+    retry = request_config.get('queue_retry') or {}
+    retry_config = {}
+    if retry.get('max_attempts'):
+        retry_config['max_attempts'] = int(retry['max_attempts'])
+    if retry.get('min_backoff'):
+        retry_config['min_backoff'] = datetime.timedelta(seconds=retry['min_backoff'])
+    if retry.get('max_backoff'):
+        retry_config['max_backoff'] = datetime.timedelta(seconds=retry['max_backoff'])
+
+    queue = {}
+    if rate_limits:
+        queue['rate_limits'] = RateLimits(**rate_limits)
+    if retry_config:
+        queue['retry_config'] = RetryConfig(**retry_config)
+
+    return Queue(**queue)
+
+def connector_request_config():
+    # The api-connector only receives request_config, so response settings and the dispatch mode travel inside it
+    connector_config = dict(request_config, response_config=api_config.get('response_config', {}))
+    if api_config.get('dispatch_mode'):
+        connector_config['dispatch_mode'] = api_config['dispatch_mode']
+    return connector_config
+
 def get_expiration_time(seconds=84600):
     expiration_time = datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(
         seconds=seconds
     )
     return int(expiration_time.timestamp() * 1000)
 
-def run_bq_job(**kwargs):
-    task_instance = kwargs['ti']
+def build_sql_query_source():
     def _json_pairs(alias, dynamic_query_string, static_query_string):
         def _to_query_pairs(items, remove_quotes=False):
             q = '`' if remove_quotes else '"'
@@ -101,7 +139,42 @@ def run_bq_job(**kwargs):
     sql_body = _json_pairs('body',dynamic_body, static_body)
     sql_headers = _json_pairs('headers',dynamic_headers, static_headers)
 
-    sql_query_source = ', '.join([sql_query_secret, sql_query, sql_body,  sql_headers])
+    return ', '.join([sql_query_secret, sql_query, sql_body,  sql_headers])
+
+def request_key_sql(alias=''):
+    # Same key as the api-connector's BigQueryRoutineRequest.request_key, used to map results back to source rows
+    prefix = alias + '.' if alias else ''
+    return (f"TO_HEX(SHA256(CONCAT(IFNULL({prefix}headers, ''), '\\n', "
+            f"IFNULL({prefix}query_string, ''), '\\n', IFNULL({prefix}body, ''))))")
+
+def get_bigquery_client():
+    return BigQueryHook(
+        gcp_conn_id='bigquery_default',
+        location=BQ_LOCATION,
+        impersonation_chain=[LOD_SA],
+    ).get_client(project_id=LOD_PRJ, location=BQ_LOCATION)
+
+def run_bq_job(**kwargs):
+    task_instance = kwargs['ti']
+    sql_query_source = build_sql_query_source()
+    source_table = f"{LOD_PRJ}.{LOD_BQ_DATASET}.lod_ingestion_data_"+task_instance.xcom_pull(task_ids="uuid")
+
+    row = list(get_bigquery_client().query(f"""
+        WITH query_source AS (
+            SELECT {sql_query_source} FROM `{source_table}`
+        )
+        SELECT COUNT(*) AS total, COUNT(DISTINCT {request_key_sql()}) AS distinct_requests
+        FROM query_source
+    """).result())[0]
+    dedup_requests = bool(request_config.get('dedup_requests'))
+    # The completion sensor waits for a final process log row per request sent: one per distinct
+    # request when deduplicating, otherwise one per source row, duplicates included
+    task_instance.xcom_push(key='expected_requests', value=row.distinct_requests if dedup_requests else row.total)
+
+    if dedup_requests:
+        # Identical (headers, query_string, body) triples are sent to the API only once
+        logger.info(f"Deduplicating requests: {row.total} source rows, {row.distinct_requests} distinct requests, "
+                    f"{row.total - row.distinct_requests} duplicate upstream calls saved.")
 
     sql = """
         INSERT INTO `{dataset}.{tmp_log_table}` (
@@ -113,7 +186,7 @@ def run_bq_job(**kwargs):
         )
 
         WITH query_source AS (
-            SELECT
+            SELECT {distinct}
                 '{workflow_id}' AS workflow_id,
                 '{auth}' AS auth,
                 '{request_config}' AS request_config,
@@ -143,10 +216,11 @@ def run_bq_job(**kwargs):
         tmp_log_table= task_instance.xcom_pull(task_ids="tmp_log_table", key="bigquery_table")["table_id"],
         workflow_id=workflow_id,
         tmp_result_table=task_instance.xcom_pull(task_ids="tmp_log_table", key="bigquery_table")["table_id"],
-        source_table=f"{LOD_PRJ}.{LOD_BQ_DATASET}.lod_ingestion_data_"+task_instance.xcom_pull(task_ids="uuid"),
-        queue_name=task_instance.xcom_pull(task_ids="create_queue_gct", key="return_value")["name"],
+        source_table=source_table,
+        distinct='DISTINCT' if dedup_requests else '',
+        queue_name='' if direct_dispatch else task_instance.xcom_pull(task_ids="create_queue_gct", key="return_value")["name"],
         auth=json.dumps(api_config.get('auth'),separators=(',', ':')),
-        request_config=json.dumps(api_config.get('request_config'),separators=(',', ':')),
+        request_config=json.dumps(connector_request_config(),separators=(',', ':')),
         sql_query_source=sql_query_source)
     
     logger.info("generated sql: "+sql)
@@ -170,6 +244,124 @@ def run_bq_job(**kwargs):
 
     start_run_job_in_bq.execute(kwargs)
 
+def get_tasks_hook():
+    return CloudTasksHook(impersonation_chain=[LOD_SA])
+
+def queue_is_available(**kwargs):
+    # A new queue reports RUNNING right away, but creating tasks in it can fail for a while after.
+    # Probe it with a canary task, scheduled a day ahead so it is never dispatched, then delete it.
+    queue_name = "cloud-task-api-" + kwargs['ti'].xcom_pull(task_ids="uuid")
+    hook = get_tasks_hook()
+    canary = {
+        'http_request': {'http_method': 'POST', 'url': f"https://{REGION}-{LOD_PRJ}.cloudfunctions.net/queue-probe"},
+        'schedule_time': datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(days=1),
+    }
+    try:
+        task = hook.create_task(location=REGION, queue_name=queue_name, task=canary, project_id=LOD_PRJ)
+    except Exception as e:
+        logger.info(f"Queue '{queue_name}' is not available yet: {e}")
+        return False
+
+    try:
+        hook.delete_task(location=REGION, queue_name=queue_name, task_name=task.name.split('/')[-1], project_id=LOD_PRJ)
+    except Exception as e:
+        # A canary left behind would keep the queue from ever looking empty; the next
+        # poke creates a new one and tries again
+        logger.warning(f"Could not delete the canary task '{task.name}': {e}")
+        return False
+    return True
+
+def run_is_complete(**kwargs):
+    task_instance = kwargs['ti']
+    run_id = task_instance.xcom_pull(task_ids="uuid")
+    expected = task_instance.xcom_pull(task_ids="run_bq_task", key="expected_requests")
+
+    # The api-connector marks the last process log row of every request as final. Without
+    # dedup_requests, duplicate source rows are separate requests sharing the same key.
+    completed_sql = "COUNT(DISTINCT JSON_VALUE(result, '$.key'))" if request_config.get('dedup_requests') else "COUNT(*)"
+    row = list(get_bigquery_client().query(f"""
+        SELECT {completed_sql} AS completed
+        FROM `{LOD_PRJ}.{LOD_BQ_DATASET}.tbl_process_log_{run_id}`
+        WHERE JSON_VALUE(result, '$.final') = 'true'
+    """).result())[0]
+    logger.info(f"{row.completed} of {expected} requests completed.")
+    if row.completed >= expected:
+        return True
+
+    # Tasks that ended without a final row (e.g. dropped after exhausting their retries) have still left the queue.
+    # The hook's list_tasks pages through the whole queue, so only the first page is read from the client.
+    pager = get_tasks_hook().get_conn().list_tasks(
+        request={'parent': f"projects/{LOD_PRJ}/locations/{REGION}/queues/cloud-task-api-{run_id}", 'page_size': 1}
+    )
+    return len(next(iter(pager.pages)).tasks) == 0
+
+def summarize_run(**kwargs):
+    # Throughput and latency percentiles of the run, from the api-connector's per-invocation metrics
+    run_id = kwargs['ti'].xcom_pull(task_ids="uuid")
+
+    sql = f"""
+        WITH invocations AS (
+            SELECT
+                workflow_id,
+                COUNT(*) AS invocations,
+                COUNTIF(outcome = 'completed') AS completed,
+                COUNTIF(outcome = 'failed') AS failed,
+                COUNTIF(outcome IN ('retry_scheduled', 'continued')) AS requeued,
+                SUM(publish_failures) AS publish_failures,
+                SUM(attempts) AS api_calls,
+                SUM(pages) AS pages,
+                SUM(response_bytes) AS response_bytes,
+                TIMESTAMP_DIFF(MAX(finished_at), MIN(started_at), MILLISECOND) / 1000 AS duration,
+                APPROX_QUANTILES(queue_wait_time, 100) AS queue_wait_time,
+                APPROX_QUANTILES(bq_write_time, 100) AS bq_write_time
+            FROM `{LOD_PRJ}.{LOD_BQ_DATASET}.tbl_run_metrics_{run_id}`
+            GROUP BY workflow_id
+        ),
+        calls AS (
+            SELECT APPROX_QUANTILES(elapsed_time, 100) AS upstream_time
+            FROM `{LOD_PRJ}.{LOD_BQ_DATASET}.tbl_result_{run_id}`
+            WHERE NOT IFNULL(cache_hit, FALSE)
+        )
+        SELECT
+            i.workflow_id, i.invocations, i.completed, i.failed, i.requeued, i.publish_failures, i.api_calls, i.pages, i.response_bytes, i.duration,
+            SAFE_DIVIDE(i.api_calls, i.duration) AS requests_per_second,
+            SAFE_DIVIDE(i.response_bytes, i.duration) AS bytes_per_second,
+            c.upstream_time[OFFSET(50)] AS upstream_p50, c.upstream_time[OFFSET(95)] AS upstream_p95, c.upstream_time[OFFSET(99)] AS upstream_p99,
+            i.queue_wait_time[OFFSET(50)] AS queue_wait_p50, i.queue_wait_time[OFFSET(95)] AS queue_wait_p95, i.queue_wait_time[OFFSET(99)] AS queue_wait_p99,
+            i.bq_write_time[OFFSET(50)] AS bq_write_p50, i.bq_write_time[OFFSET(95)] AS bq_write_p95, i.bq_write_time[OFFSET(99)] AS bq_write_p99
+        FROM invocations i CROSS JOIN calls c
+    """
+    logger.info("generated sql: "+sql)
+
+    summary = [dict(row.items()) for row in get_bigquery_client().query(sql).result()]
+    for row in summary:
+        logger.info(f"Run summary: {row}")
+    return json.loads(json.dumps(summary, default=str))
+
+def fan_out_results(**kwargs):
+    # Joins every source row, duplicates included, to the result of its (deduplicated) request.
+    # Rows whose request failed without a response are kept, with NULL result columns.
+    task_instance = kwargs['ti']
+    run_id = task_instance.xcom_pull(task_ids="uuid")
+
+    sql = f"""
+        CREATE OR REPLACE TABLE `{LOD_PRJ}.{LOD_BQ_DATASET}.tbl_result_rows_{run_id}`
+        OPTIONS (expiration_timestamp = TIMESTAMP_MILLIS({get_expiration_time()}))
+        AS
+        WITH query_source AS (
+            SELECT TO_JSON_STRING(src) AS source_row, {build_sql_query_source()}
+            FROM `{LOD_PRJ}.{LOD_BQ_DATASET}.lod_ingestion_data_{run_id}` src
+        )
+        SELECT s.source_row, s.headers, s.query_string, s.body, r.*
+        FROM query_source s
+        LEFT JOIN `{LOD_PRJ}.{LOD_BQ_DATASET}.tbl_result_{run_id}` r
+        ON r.request.key = {request_key_sql('s')}
+    """
+    logger.info("generated sql: "+sql)
+
+    get_bigquery_client().query(sql).result()
+    logger.info(f"Fanned results out to 'tbl_result_rows_{run_id}'.")
+
 # Start Declare DAG
 with DAG(
     **config_dag_paramns
@@ -185,10 +377,6 @@ with DAG(
         trigger_rule='all_success'
     )
 
-    #https://cloud.google.com/tasks/docs/creating-queues?hl=en#create_a_queue
-    #It can take a few minutes for a newly created queue to be available. We will wait 60 secs
-    wait60secs = TimeDeltaSensor(task_id="wait_queue_tobe_available", delta=pendulum.duration(seconds=60))
-
     generate_uuid = PythonOperator(
         task_id='uuid',
         python_callable=lambda: datetime.datetime.now().strftime("%Y%m%d%H%M%S")
@@ -253,14 +441,25 @@ with DAG(
                     {'name': 'method', 'type': 'STRING', 'mode': 'NULLABLE'},
                     {'name': 'auth_type', 'type': 'STRING', 'mode': 'NULLABLE'},
                     {'name': 'query_string', 'type': 'STRING', 'mode': 'NULLABLE'},
-                    {'name': 'body', 'type': 'STRING', 'mode': 'NULLABLE'}
+                    {'name': 'body', 'type': 'STRING', 'mode': 'NULLABLE'},
+                    {'name': 'key', 'type': 'STRING', 'mode': 'NULLABLE'}
                 ]},
                 {'name': 'request_time', 'type': 'TIMESTAMP', 'mode': 'NULLABLE'},
                 {'name': 'elapsed_time', 'type': 'FLOAT', 'mode': 'NULLABLE'},
+                {'name': 'timing', 'type': 'RECORD', 'mode': 'NULLABLE', 'fields': [
+                    {'name': 'connect_time', 'type': 'FLOAT', 'mode': 'NULLABLE'},
+                    {'name': 'tls_time', 'type': 'FLOAT', 'mode': 'NULLABLE'},
+                    {'name': 'server_time', 'type': 'FLOAT', 'mode': 'NULLABLE'}
+                ]},
+                {'name': 'cache_hit', 'type': 'BOOLEAN', 'mode': 'NULLABLE'},
                 {'name': 'response', 'type': 'RECORD', 'mode': 'NULLABLE', 'fields': [
                     {'name': 'status_code', 'type': 'INTEGER', 'mode': 'NULLABLE'},
                     {'name': 'headers', 'type': 'STRING', 'mode': 'NULLABLE'},
-                    {'name': 'body', 'type': 'STRING', 'mode': 'NULLABLE'}
+                    {'name': 'body', 'type': 'STRING', 'mode': 'NULLABLE'},
+                    {'name': 'body_encoding', 'type': 'STRING', 'mode': 'NULLABLE'},
+                    {'name': 'body_uri', 'type': 'STRING', 'mode': 'NULLABLE'},
+                    {'name': 'body_size', 'type': 'INTEGER', 'mode': 'NULLABLE'},
+                    {'name': 'body_hash', 'type': 'STRING', 'mode': 'NULLABLE'}
                 ]}
             ]
             }
@@ -269,44 +468,169 @@ with DAG(
         impersonation_chain=[LOD_SA],
     )
 
-    create_queue = CloudTasksQueueCreateOperator(
-        location=REGION,
+    # One row per api-connector invocation, written when the connector's RUN_METRICS is enabled
+    create_run_metrics_table = BigQueryCreateEmptyTableOperator(
+        task_id='tmp_run_metrics_table',
         project_id=LOD_PRJ,
-        task_queue=Queue(),
-        queue_name="cloud-task-api-{{ task_instance.xcom_pull(task_ids='uuid') }}",
-        task_id="create_queue_gct",
+        dataset_id=LOD_BQ_DATASET,
+        table_id='tbl_run_metrics_{{ task_instance.xcom_pull(task_ids="uuid") }}',
+        location='US',
+        table_resource={
+            "expirationTime": get_expiration_time(),
+            "schema": {"fields":[
+                {'name': 'workflow_id', 'type': 'STRING', 'mode': 'NULLABLE'},
+                {'name': 'request_key', 'type': 'STRING', 'mode': 'NULLABLE'},
+                {'name': 'outcome', 'type': 'STRING', 'mode': 'NULLABLE'},
+                {'name': 'status_code', 'type': 'INTEGER', 'mode': 'NULLABLE'},
+                {'name': 'enqueued_at', 'type': 'TIMESTAMP', 'mode': 'NULLABLE'},
+                {'name': 'started_at', 'type': 'TIMESTAMP', 'mode': 'NULLABLE'},
+                {'name': 'finished_at', 'type': 'TIMESTAMP', 'mode': 'NULLABLE'},
+                {'name': 'queue_wait_time', 'type': 'FLOAT', 'mode': 'NULLABLE'},
+                {'name': 'attempts', 'type': 'INTEGER', 'mode': 'NULLABLE'},
+                {'name': 'pages', 'type': 'INTEGER', 'mode': 'NULLABLE'},
+                {'name': 'response_bytes', 'type': 'INTEGER', 'mode': 'NULLABLE'},
+                {'name': 'upstream_time', 'type': 'FLOAT', 'mode': 'NULLABLE'},
+                {'name': 'bq_write_time', 'type': 'FLOAT', 'mode': 'NULLABLE'},
+                {'name': 'publish_failures', 'type': 'INTEGER', 'mode': 'NULLABLE'},
+                {'name': 'records', 'type': 'INTEGER', 'mode': 'NULLABLE'}
+            ]}
+        },
+        gcp_conn_id='bigquery_default',
         impersonation_chain=[LOD_SA],
     )
 
-    delete_queue = CloudTasksQueueDeleteOperator(
-        location=REGION,
-        project_id=LOD_PRJ,
-        queue_name="cloud-task-api-{{ task_instance.xcom_pull(task_ids='uuid') }}",
-        task_id="delete_queue_gct",
-        impersonation_chain=[LOD_SA],
-        trigger_rule='all_done'
-    )
+    setup_tasks = [gcs_to_bigquery_execute, create_result_tmp_final_table, create_tmp_log_table, create_run_metrics_table]
+    if not direct_dispatch:
+        #https://cloud.google.com/tasks/docs/creating-queues?hl=en#create_a_queue
+        #It can take a few minutes for a newly created queue to be available. We probe it until it is
+        wait_for_queue = PythonSensor(
+            task_id="wait_queue_tobe_available",
+            python_callable=queue_is_available,
+            poke_interval=5,
+            timeout=600,
+            mode='poke'
+        )
 
+        create_queue = CloudTasksQueueCreateOperator(
+            location=REGION,
+            project_id=LOD_PRJ,
+            task_queue=build_task_queue(),
+            queue_name="cloud-task-api-{{ task_instance.xcom_pull(task_ids='uuid') }}",
+            task_id="create_queue_gct",
+            impersonation_chain=[LOD_SA],
+        )
 
-    # Use TaskQueueEmptySensor to wait until the Cloud Tasks queue is empty
-    wait_for_empty_queue = TaskQueueEmptySensor(
-        task_id='wait_for_queue_empty',
-        project_id=LOD_PRJ,
-        location=REGION,
-        queue_name="{{ task_instance.xcom_pull(task_ids='create_queue_gct', key='cloud_task_queue')['queue_id'] }}",
-        poke_interval=60,  # Check every 60 seconds
-        timeout=3600*6,    # Timeout after 6 hour- max time to wait BigQuery
-        mode='poke',       # Block the task until the queue is empty
-        impersonation_chain=[LOD_SA]
+        delete_queue = CloudTasksQueueDeleteOperator(
+            location=REGION,
+            project_id=LOD_PRJ,
+            queue_name="cloud-task-api-{{ task_instance.xcom_pull(task_ids='uuid') }}",
+            task_id="delete_queue_gct",
+            impersonation_chain=[LOD_SA],
+            trigger_rule='all_done'
+        )
+
+
+        # Wait until every request has completed, releasing the worker slot between checks
+        wait_for_completion = PythonSensor(
+            task_id='wait_for_completion',
+            python_callable=run_is_complete,
+            poke_interval=15,  # Check every 15 seconds
+            timeout=3600*6,    # Timeout after 6 hour- max time to wait BigQuery
+            mode='reschedule'
+        )
+
+        setup_tasks.append(create_queue)
+
+    if api_config.get('response_config', {}).get('dedup_bodies'):
+        # Distinct response bodies, referenced by response.body_hash, when dedup_bodies is enabled
+        create_result_body_table = BigQueryCreateEmptyTableOperator(
+            task_id='tmp_result_body_table',
+            project_id=LOD_PRJ,
+            dataset_id=LOD_BQ_DATASET,
+            table_id='tbl_result_body_{{ task_instance.xcom_pull(task_ids="uuid") }}',
+            location='US',
+            table_resource={
+                "expirationTime": get_expiration_time(),
+                "schema": {"fields":[
+                    {'name': 'body_hash', 'type': 'STRING', 'mode': 'NULLABLE'},
+                    {'name': 'body_encoding', 'type': 'STRING', 'mode': 'NULLABLE'},
+                    {'name': 'body', 'type': 'STRING', 'mode': 'NULLABLE'}
+                ]}
+            },
+            gcp_conn_id='bigquery_default',
+            impersonation_chain=[LOD_SA],
+        )
+        setup_tasks.append(create_result_body_table)
+
+    extract_config = api_config.get('response_config', {}).get('extract')
+    if extract_config:
+        # One typed row per record extracted from the responses, with a column per field. Unlike the
+        # run's tables, this one is shared by every run of the workflow and never expires: it is
+        # created by the first run, and later runs keep it as is (schema changes must be applied to it).
+        create_records_table = BigQueryCreateEmptyTableOperator(
+            task_id='records_table',
+            project_id=LOD_PRJ,
+            dataset_id=LOD_BQ_DATASET,
+            table_id='tbl_records_' + re.sub(r'[^0-9A-Za-z_]', '_', workflow_id),
+            location='US',
+            exists_ok=True,
+            table_resource={
+                "schema": {"fields":[
+                    {'name': field['name'], 'type': (field.get('type') or 'STRING').upper(), 'mode': 'NULLABLE'}
+                    for field in extract_config.get('fields', [])
+                ] + [
+                    {'name': '_source', 'type': 'RECORD', 'mode': 'NULLABLE', 'fields': [
+                        {'name': 'run_id', 'type': 'STRING', 'mode': 'NULLABLE'},
+                        {'name': 'request_key', 'type': 'STRING', 'mode': 'NULLABLE'},
+                        {'name': 'page', 'type': 'INTEGER', 'mode': 'NULLABLE'},
+                        {'name': 'record_index', 'type': 'INTEGER', 'mode': 'NULLABLE'},
+                        {'name': 'extracted_at', 'type': 'TIMESTAMP', 'mode': 'NULLABLE'}
+                    ]}
+                ]}
+            },
+            gcp_conn_id='bigquery_default',
+            impersonation_chain=[LOD_SA],
+        )
+        setup_tasks.append(create_records_table)
+
+    if direct_dispatch:
+        # Every API call has completed once the BigQuery job returns
+        start >> \
+        generate_uuid >> \
+        setup_tasks >> \
+        run_bq_task
+
+        completion = run_bq_task
+    else:
+        start >> \
+        generate_uuid >> \
+        setup_tasks >> \
+        wait_for_queue >> \
+        run_bq_task >> \
+        wait_for_completion
+
+        completion = wait_for_completion
+
+    summary_task = PythonOperator(
+        task_id='summarize_run',
+        python_callable=summarize_run,
+        provide_context=True
     )
+    completion = completion >> summary_task
 
-    start >> \
-    generate_uuid >> \
-    [gcs_to_bigquery_execute, create_result_tmp_final_table,create_tmp_log_table,create_queue] >> \
-    wait60secs >> \
-    run_bq_task >> \
-    wait_for_empty_queue >> \
-    delete_queue >> \
-    end
+    if request_config.get('dedup_requests'):
+        fan_out_task = PythonOperator(
+            task_id='fan_out_results',
+            python_callable=fan_out_results,
+            provide_context=True
+        )
+        completion = completion >> fan_out_task
+
+    if direct_dispatch:
+        completion >> end
+    else:
+        completion >> \
+        delete_queue >> \
+        end
     #[delete_queue,gcs_to_bigquery_table_expiration] >> \
     # [delete_queue,delete_result_tmp_final_table] >> \
\ No newline at end of file
@@ -12,21 +12,21 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-import traceback
-
 import flask
 import flask.typing
 import functions_framework
 
 from .src.handler import Handler
 from .src.logger import logger
+from .src.metrics import Metrics
 
 
 @functions_framework.http
 def main(request: flask.Request) -> flask.typing.ResponseReturnValue:
     try:
         (msg, code) = Handler.execute(request)
+        Metrics.report()
         return flask.Response(msg + "\n"), code
     except Exception as e:
-        logger.error(f"Exception occurred: {traceback.format_exception(e)}")
+        logger.error("Exception occurred: %s", e, exc_info=e)
         return flask.Response(f"Exception occurred: {e}"), 500
@@ -12,8 +12,17 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import threading
+import time
+from typing import Any, Dict, Tuple
+
+import requests
 from requests.auth import AuthBase
 
+from .config import config
+from .logger import logger
+from .metrics import Metrics
+
 
 class TokenAuth(AuthBase):
     def __init__(self, token, auth_scheme="Bearer"):
@@ -23,3 +32,97 @@ class TokenAuth(AuthBase):
     def __call__(self, request):
         request.headers["Authorization"] = f"{self.auth_scheme} {self.token}"
         return request
+
+
+class TokenRequestError(Exception):
+    pass
+
+
+class TokenCache:
+    """
+    Process-wide cache of OAuth 2.0 client-credentials tokens, keyed by
+    (auth_server, client_id). Tokens are refreshed ahead of their expiry by a single
+    thread while the others keep using the current token; once a token has expired,
+    concurrent callers wait for the one refresh in flight instead of starting their own.
+    """
+
+    _lock = threading.Lock()
+    _tokens: Dict[Tuple[str, str], Dict[str, Any]] = {}
+    _refresh_locks: Dict[Tuple[str, str], threading.Lock] = {}
+
+    @staticmethod
+    def get(auth_server: str, client_id: str, client_secret: str) -> str:
+        key = (auth_server, client_id)
+        entry = TokenCache._tokens.get(key)
+        now = time.monotonic()
+
+        if entry and now < entry["refresh_at"]:
+            Metrics.increment("token_cache.hit")
+            return entry["token"]
+
+        refresh_lock = TokenCache._refresh_lock(key)
+
+        if entry and now < entry["expires_at"]:
+            # Early refresh: only one caller refreshes, the rest use the current token
+            if not refresh_lock.acquire(blocking=False):
+                Metrics.increment("token_cache.hit")
+                return entry["token"]
+        else:
+            refresh_lock.acquire()
+
+        try:
+            entry = TokenCache._tokens.get(key)
+            if entry and time.monotonic() < entry["refresh_at"]:
+                Metrics.increment("token_cache.hit")
+                return entry["token"]
+
+            Metrics.increment("token_cache.miss")
+            token, expires_in = TokenCache._request(auth_server, client_id, client_secret)
+
+            now = time.monotonic()
+            TokenCache._tokens[key] = {
+                "token": token,
+                "expires_at": now + expires_in,
+                "refresh_at": now + expires_in - min(config.OAUTH_REFRESH_MARGIN, expires_in / 10),
+            }
+            return token
+        finally:
+            refresh_lock.release()
+
+    @staticmethod
+    def invalidate(auth_server: str, client_id: str, token: str):
+        """Drops the cached token, unless it was already replaced by a newer one."""
+        key = (auth_server, client_id)
+        with TokenCache._lock:
+            entry = TokenCache._tokens.get(key)
+            if entry and entry["token"] == token:
+                del TokenCache._tokens[key]
+                Metrics.increment("token_cache.invalidated")
+
+    @staticmethod
+    def _refresh_lock(key: Tuple[str, str]) -> threading.Lock:
+        with TokenCache._lock:
+            return TokenCache._refresh_locks.setdefault(key, threading.Lock())
+
+    @staticmethod
+    def _request(auth_server: str, client_id: str, client_secret: str) -> Tuple[str, float]:
+        logger.debug("Requesting credentials from server...")
+
+        token_res = requests.post(
+            url=auth_server,
+            data={"grant_type": "client_credentials"},
+            allow_redirects=False,
+            auth=(client_id, client_secret),
+        )
+
+        if token_res.status_code != 200:
+            raise TokenRequestError(f"Failed to obtain token from the OAuth 2.0 server: {token_res.text}")
+
+        token_json = token_res.json()
+        access_token = token_json.get("access_token")
+        if not access_token:
+            raise KeyError("Missing property: 'access_token'")
+
+        logger.debug("Success.")
+
+        return access_token, float(token_json.get("expires_in") or config.OAUTH_DEFAULT_EXPIRES_IN)
@@ -0,0 +1,84 @@
+# Copyright 2022 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import base64
+import gzip
+import threading
+from collections import OrderedDict
+
+from .config import config
+
+
+class BodyCodec:
+    """Compresses response bodies into base64 strings that fit a BigQuery STRING column."""
+
+    ENCODINGS = ["none", "gzip", "zstd"]
+
+    @staticmethod
+    def encode(data: bytes, encoding: str) -> str:
+        match (encoding):
+            case "gzip":
+                compressed = gzip.compress(data)
+            case "zstd":
+                import zstandard
+
+                compressed = zstandard.ZstdCompressor().compress(data)
+            case _:
+                raise ValueError(f"Body encoding '{encoding}' is not supported.")
+
+        return base64.b64encode(compressed).decode("ascii")
+
+    @staticmethod
+    def decode(value: str, encoding: str) -> bytes:
+        compressed = base64.b64decode(value)
+
+        match (encoding):
+            case "gzip":
+                return gzip.decompress(compressed)
+            case "zstd":
+                import zstandard
+
+                return zstandard.ZstdDecompressor().decompress(compressed)
+            case _:
+                raise ValueError(f"Body encoding '{encoding}' is not supported.")
+
+
+class BodyIndex:
+    """
+    Bounded, process-wide record of the body hashes already written to each body
+    table, so a deduplicated body is normally written once per instance.
+    """
+
+    _lock = threading.Lock()
+    _seen: "OrderedDict[str, None]" = OrderedDict()
+
+    @staticmethod
+    def add(table: str, body_hash: str) -> bool:
+        """Returns True the first time `body_hash` is seen for `table`."""
+        key = f"{table}:{body_hash}"
+        with BodyIndex._lock:
+            if key in BodyIndex._seen:
+                BodyIndex._seen.move_to_end(key)
+                return False
+
+            BodyIndex._seen[key] = None
+            if len(BodyIndex._seen) > config.BODY_INDEX_SIZE:
+                BodyIndex._seen.popitem(last=False)
+            return True
+
+    @staticmethod
+    def discard(table: str, body_hash: str):
+        """Forgets `body_hash`, e.g. because writing it failed, so it is written again."""
+        with BodyIndex._lock:
+            BodyIndex._seen.pop(f"{table}:{body_hash}", None)
@@ -0,0 +1,116 @@
+# Copyright 2022 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import threading
+import time
+from typing import TYPE_CHECKING, Any, Callable, Dict
+
+from .config import config
+from .logger import logger
+from .metrics import Metrics
+
+if TYPE_CHECKING:
+    from google.cloud import bigquery, pubsub_v1, secretmanager, storage, tasks_v2
+
+
+class Clients:
+    """
+    Lazily created Google Cloud clients, shared by every request served by this
+    instance. Each client holds a single gRPC/HTTP channel, so reusing them across
+    warm invocations avoids a handshake and credential refresh per call.
+    """
+
+    _lock = threading.Lock()
+    _instances: Dict[str, Any] = {}
+
+    @staticmethod
+    def _get(name: str, factory: Callable[[], Any]) -> Any:
+        client = Clients._instances.get(name)
+        if client is not None:
+            return client
+
+        with Clients._lock:
+            client = Clients._instances.get(name)
+            if client is None:
+                start = time.perf_counter()
+                client = factory()
+                elapsed = time.perf_counter() - start
+
+                Metrics.increment(f"clients.{name}.created")
+                Metrics.observe(f"clients.{name}.create_time", elapsed)
+                logger.debug("Created '%s' client in %.3fs.", name, elapsed)
+
+                Clients._instances[name] = client
+        return client
+
+    # Client libraries are only imported by the code paths that use them, which
+    # keeps them out of the cold start of requests that don't.
+
+    @staticmethod
+    def bigquery() -> "bigquery.Client":
+        def create():
+            from google.cloud import bigquery
+
+            return bigquery.Client()
+
+        return Clients._get("bigquery", create)
+
+    @staticmethod
+    def tasks() -> "tasks_v2.CloudTasksClient":
+        def create():
+            from google.cloud import tasks_v2
+
+            return tasks_v2.CloudTasksClient()
+
+        return Clients._get("tasks", create)
+
+    @staticmethod
+    def secret_manager() -> "secretmanager.SecretManagerServiceClient":
+        def create():
+            from google.cloud import secretmanager
+
+            return secretmanager.SecretManagerServiceClient()
+
+        return Clients._get("secret_manager", create)
+
+    @staticmethod
+    def publisher() -> "pubsub_v1.PublisherClient":
+        def create():
+            from google.cloud import pubsub_v1
+
+            return pubsub_v1.PublisherClient(
+                batch_settings=pubsub_v1.types.BatchSettings(
+                    max_messages=config.PUBSUB_MAX_MESSAGES,
+                    max_bytes=config.PUBSUB_MAX_BYTES,
+                    max_latency=config.PUBSUB_MAX_LATENCY,
+                ),
+                publisher_options=pubsub_v1.types.PublisherOptions(enable_message_ordering=True),
+            )
+
+        return Clients._get("publisher", create)
+
+    @staticmethod
+    def storage() -> "storage.Client":
+        def create():
+            from google.cloud import storage
+
+            return storage.Client()
+
+        return Clients._get("storage", create)
+
+    @staticmethod
+    def reset():
+        """Drops every cached client, e.g. after a fork."""
+        with Clients._lock:
+            Clients._instances.clear()
@@ -15,6 +15,22 @@
 import os
 
 
+class required_env:
+    """
+    A required environment variable, read when first accessed rather than at
+    import, so that a missing variable fails the request that needs it.
+    """
+
+    def __init__(self, key: str):
+        self.key = key
+
+    def __get__(self, instance, owner) -> str:
+        val = os.getenv(self.key)
+        if not val:
+            raise KeyError(f"Environment variable '{self.key}' must be set.")
+        return val
+
+
 class config:
     @staticmethod
     def __env(key: str, required=True):
@@ -23,8 +39,60 @@ class config:
             raise KeyError(f"Environment variable '{key}' must be set.")
         return val
 
-    PROJECT_ID = __env("PROJECT_ID", required=True)
+    PROJECT_ID = required_env("PROJECT_ID")
     FUNCTION_NAME = __env("FUNCTION_NAME", required=False)
     REGION = __env("REGION", required=False)
     ENVIRONMENT = __env("ENVIRONMENT", required=False) or "local"
     PUBSUB_TOPICS = __env("PUBSUB_TOPICS", required=False)
+    LOD_GCS_STAGING = __env("LOD_GCS_STAGING", required=False)
+    # Number of rows of a BigQuery Routine batch that are enqueued concurrently.
+    ENQUEUE_WORKERS = int(__env("ENQUEUE_WORKERS", required=False) or 16)
+    # Limits for a single BigQuery streaming insert request.
+    BQ_MAX_BATCH_ROWS = int(__env("BQ_MAX_BATCH_ROWS", required=False) or 500)
+    BQ_MAX_BATCH_BYTES = int(__env("BQ_MAX_BATCH_BYTES", required=False) or 9 * 1024 * 1024)
+    # Seconds a table's metadata is reused before it is fetched again.
+    BQ_TABLE_CACHE_TTL = float(__env("BQ_TABLE_CACHE_TTL", required=False) or 300)
+    # When false, rows are inserted by table ID without fetching the table schema.
+    BQ_FETCH_TABLE_SCHEMA = (__env("BQ_FETCH_TABLE_SCHEMA", required=False) or "true").lower() == "true"
+    # Lifetime assumed for OAuth 2.0 tokens whose response has no `expires_in`.
+    OAUTH_DEFAULT_EXPIRES_IN = float(__env("OAUTH_DEFAULT_EXPIRES_IN", required=False) or 300)
+    # Seconds before expiry at which a cached OAuth 2.0 token is refreshed.
+    OAUTH_REFRESH_MARGIN = float(__env("OAUTH_REFRESH_MARGIN", required=False) or 60)
+    # Minimum seconds between two INFO logs of the instance's counters and timers.
+    METRICS_LOG_INTERVAL = float(__env("METRICS_LOG_INTERVAL", required=False) or 60)
+    # Seconds a secret read through a version alias (e.g. 'latest') is cached.
+    SECRET_CACHE_TTL = float(__env("SECRET_CACHE_TTL", required=False) or 60)
+    # Maximum number of keep-alive connections per upstream host.
+    HTTP_POOL_SIZE = int(__env("HTTP_POOL_SIZE", required=False) or 10)
+    # Default guards for paginated requests, overridable per workflow.
+    PAGINATION_MAX_PAGES = int(__env("PAGINATION_MAX_PAGES", required=False) or 1000)
+    PAGINATION_MAX_BYTES = int(__env("PAGINATION_MAX_BYTES", required=False) or 1024 * 1024 * 1024)
+    # Seconds a task may spend walking pages before it hands the rest to a new task.
+    PAGINATION_TIME_BUDGET = float(__env("PAGINATION_TIME_BUDGET", required=False) or 300)
+    # Response bodies larger than this are kept on disk instead of in memory.
+    RESPONSE_SPOOL_SIZE = int(__env("RESPONSE_SPOOL_SIZE", required=False) or 1024 * 1024)
+    # Response bodies larger than this are written to LOD_GCS_STAGING instead of BigQuery.
+    OFFLOAD_THRESHOLD_BYTES = int(__env("OFFLOAD_THRESHOLD_BYTES", required=False) or 1024 * 1024)
+    # Number of deduplicated body hashes remembered by an instance.
+    BODY_INDEX_SIZE = int(__env("BODY_INDEX_SIZE", required=False) or 100000)
+    # Response cache settings shared by every workflow that enables caching.
+    RESPONSE_CACHE_MAX_ENTRIES = int(__env("RESPONSE_CACHE_MAX_ENTRIES", required=False) or 1000)
+    RESPONSE_CACHE_STALE_TTL = float(__env("RESPONSE_CACHE_STALE_TTL", required=False) or 3600)
+    RESPONSE_CACHE_REDIS_URL = __env("RESPONSE_CACHE_REDIS_URL", required=False)
+    # When true, each Cloud Task request writes a row to its run's tbl_run_metrics table.
+    RUN_METRICS = (__env("RUN_METRICS", required=False) or "true").lower() == "true"
+    # Requests of a multi-request Cloud Task run concurrently (per-workflow `batch_concurrency`).
+    TASK_BATCH_WORKERS = int(__env("TASK_BATCH_WORKERS", required=False) or 8)
+    # When set, finished tracing spans are appended to this file as JSON lines.
+    TRACE_EXPORT_PATH = __env("TRACE_EXPORT_PATH", required=False)
+    # Pub/Sub batching: a batch is sent once it holds this many messages or bytes, or after this many seconds.
+    PUBSUB_MAX_MESSAGES = int(__env("PUBSUB_MAX_MESSAGES", required=False) or 500)
+    PUBSUB_MAX_BYTES = int(__env("PUBSUB_MAX_BYTES", required=False) or 5 * 1024 * 1024)
+    PUBSUB_MAX_LATENCY = float(__env("PUBSUB_MAX_LATENCY", required=False) or 0.05)
+    # Messages larger than this are gzip-compressed; publishes not confirmed within the timeout fail.
+    PUBSUB_COMPRESS_THRESHOLD = int(__env("PUBSUB_COMPRESS_THRESHOLD", required=False) or 64 * 1024)
+    PUBSUB_PUBLISH_TIMEOUT = float(__env("PUBSUB_PUBLISH_TIMEOUT", required=False) or 60)
+    # Log messages, including response bodies logged at DEBUG level, are cut after this many characters.
+    LOG_MAX_MESSAGE_LENGTH = int(__env("LOG_MAX_MESSAGE_LENGTH", required=False) or 8192)
+    # Threads for background writes, which overlap with the rest of a request.
+    IO_WORKERS = int(__env("IO_WORKERS", required=False) or 8)
@@ -0,0 +1,210 @@
+# Copyright 2022 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import json
+import re
+from datetime import date, datetime, time, timezone
+from decimal import Decimal
+from typing import IO, Any, Dict, Iterator, List, Optional, Union
+
+from .logger import logger
+
+# `.key`, `['key']`, `[0]` or `[*]`
+PATH_STEP = re.compile(r"\.([^.\[\]]+)|\[(\d+|\*)\]|\[['\"]([^'\"]+)['\"]\]")
+
+
+class Extractor:
+    """
+    Turns a JSON response into typed rows according to the `extract` section of a
+    workflow's `response_config`: one row per record found at the `records` path,
+    with one column per entry of `fields`. The body is parsed as it is read, so
+    only one record is held in memory at a time.
+    """
+
+    TYPES = [
+        "STRING",
+        "INTEGER",
+        "FLOAT",
+        "NUMERIC",
+        "BIGNUMERIC",
+        "BOOLEAN",
+        "TIMESTAMP",
+        "DATE",
+        "DATETIME",
+        "TIME",
+        "JSON",
+    ]
+
+    # Column holding where each record comes from; field names can't use it
+    SOURCE_FIELD = "_source"
+
+    def __init__(self, settings: Any):
+        records = Extractor.parse_path(settings.get("records") or "$")
+        if any(isinstance(step, int) for step in records):
+            raise ValueError("The records path of 'extract' can't select array indexes.")
+        # ijson names array items `item` and joins the keys of their parents with dots
+        self.prefix = ".".join("item" if step == "*" else step for step in records)  # type: ignore
+
+        self.fields: List[Dict[str, Any]] = []
+        for field in settings.get("fields") or []:
+            name = field.get("name")
+            field_type = (field.get("type") or "STRING").upper()
+            if not name or name == Extractor.SOURCE_FIELD:
+                raise ValueError(f"Field name '{name}' of 'extract' is not valid.")
+            if field_type not in Extractor.TYPES:
+                raise ValueError(f"Field type '{field_type}' of '{name}' is not supported.")
+            path = Extractor.parse_path(field.get("path") or f"$.{name}")
+            if "*" in path:
+                raise ValueError(f"The path of field '{name}' can't select every array item.")
+            self.fields.append({"name": name, "path": path, "type": field_type})
+        if not self.fields:
+            raise ValueError("The 'extract' section must list at least one field.")
+
+    @staticmethod
+    def from_config(response_config: Any) -> Optional["Extractor"]:
+        settings = response_config.get("extract")
+        if not settings:
+            return None
+
+        response_format = (response_config.get("format") or "JSON").upper()
+        if response_format != "JSON":
+            raise ValueError(f"Records can't be extracted from '{response_format}' responses.")
+        return Extractor(settings)
+
+    @staticmethod
+    def table(result_table: str, workflow_id: str) -> str:
+        """
+        Records of every run of a workflow go to one table, next to the run's
+        `tbl_result`, which the DAG creates once and never expires.
+        """
+        dataset = result_table.rsplit(".", 1)[0]
+        return f"{dataset}.tbl_records_{re.sub(r'[^0-9A-Za-z_]', '_', workflow_id)}"
+
+    @staticmethod
+    def parse_path(path: str) -> List[Union[str, int]]:
+        """Splits a JSONPath such as `$.data.items[*]` or `$.address['zip code']` into steps."""
+        if not path.startswith("$"):
+            raise ValueError(f"Path '{path}' must start with '$'.")
+
+        steps: List[Union[str, int]] = []
+        position = 1
+        while position < len(path):
+            match = PATH_STEP.match(path, position)
+            if not match:
+                raise ValueError(f"Path '{path}' is not supported at position {position}.")
+            (key, index, quoted) = match.groups()
+            if index is not None:
+                steps.append("*" if index == "*" else int(index))
+            else:
+                steps.append(key if key is not None else quoted)
+            position = match.end()
+        return steps
+
+    def rows(self, file: IO[bytes]) -> Iterator[Dict[str, Any]]:
+        """Yields a row for each record of the JSON document read from `file`."""
+        import ijson
+
+        for record in ijson.items(file, self.prefix):
+            yield {
+                field["name"]: Extractor.cast(
+                    Extractor.lookup(record, field["path"]), field["type"], field["name"]
+                )
+                for field in self.fields
+            }
+
+    @staticmethod
+    def lookup(value: Any, path: List[Union[str, int]]) -> Any:
+        for step in path:
+            try:
+                value = value[step]
+            except (KeyError, IndexError, TypeError):
+                return None
+        return value
+
+    @staticmethod
+    def parse_datetime(value: Any) -> datetime:
+        if not isinstance(value, str):
+            raise TypeError(type(value).__name__)
+        # fromisoformat (Python 3.10) takes neither a 'Z' suffix nor BigQuery's ' UTC'
+        for suffix in ("Z", " UTC"):
+            if value.endswith(suffix):
+                value = value[: -len(suffix)] + "+00:00"
+        return datetime.fromisoformat(value)
+
+    @staticmethod
+    def cast(value: Any, field_type: str, name: str) -> Any:
+        """
+        Converts a parsed JSON value to what a BigQuery streaming insert accepts for
+        the column type. Values that can't be converted, such as a non-integral
+        INTEGER or an invalid date, are written as NULL.
+        """
+        if value is None:
+            return None
+
+        try:
+            match (field_type):
+                case "JSON":
+                    return json.dumps(value, default=float)
+                case "STRING":
+                    if isinstance(value, (dict, list)):
+                        return json.dumps(value, default=float)
+                    if isinstance(value, bool):
+                        return "true" if value else "false"
+                    return str(value)
+                case "INTEGER":
+                    if isinstance(value, (dict, list)):
+                        raise TypeError(type(value).__name__)
+                    if isinstance(value, bool):
+                        return int(value)
+                    number = Decimal(str(value))
+                    if number != number.to_integral_value():
+                        raise ValueError(f"{value} is not an integer")
+                    return int(number)
+                case "FLOAT":
+                    if isinstance(value, (dict, list)):
+                        raise TypeError(type(value).__name__)
+                    return float(value)
+                case "NUMERIC" | "BIGNUMERIC":
+                    # Sent as a string, so that no precision is lost on the way
+                    return str(Decimal(str(value)))
+                case "BOOLEAN":
+                    if isinstance(value, str) and value.lower() in ("true", "false"):
+                        return value.lower() == "true"
+                    if not isinstance(value, (bool, int)):
+                        raise TypeError(type(value).__name__)
+                    return bool(value)
+                case "TIMESTAMP":
+                    # Epoch seconds, or an ISO 8601 date and time (UTC unless it has an offset)
+                    if isinstance(value, (int, Decimal)) and not isinstance(value, bool):
+                        return datetime.fromtimestamp(float(value), timezone.utc).isoformat()
+                    parsed = Extractor.parse_datetime(value)
+                    if parsed.tzinfo is None:
+                        parsed = parsed.replace(tzinfo=timezone.utc)
+                    return parsed.isoformat()
+                case "DATETIME":
+                    parsed = Extractor.parse_datetime(value)
+                    if parsed.tzinfo is not None:
+                        raise ValueError(f"'{value}' has a time zone")
+                    return parsed.isoformat()
+                case "DATE":
+                    if not isinstance(value, str):
+                        raise TypeError(type(value).__name__)
+                    return date.fromisoformat(value).isoformat()
+                case "TIME":
+                    if not isinstance(value, str):
+                        raise TypeError(type(value).__name__)
+                    return time.fromisoformat(value).isoformat()
+        except (ArithmeticError, OSError, TypeError, ValueError) as e:
+            logger.warning("Field '%s' can't be written as %s: %s", name, field_type, e)
+            return None
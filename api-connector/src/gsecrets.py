@@ -12,12 +12,37 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-from google.cloud import secretmanager
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+from .clients import Clients
+from .config import config
+from .metrics import Metrics
 
 
 class Secrets:
+    # Secret values are only ever kept in memory: never log or persist them.
+    _lock = threading.Lock()
+    _cache: Dict[str, Tuple[Optional[float], str]] = {}
+
     @staticmethod
     def get_value(secret_name: str):
-        client = secretmanager.SecretManagerServiceClient()
+        entry = Secrets._cache.get(secret_name)
+        if entry and (entry[0] is None or time.monotonic() < entry[0]):
+            Metrics.increment("secret_cache.hit")
+            return entry[1]
+
+        Metrics.increment("secret_cache.miss")
+        client = Clients.secret_manager()
         response = client.access_secret_version(name=secret_name)
-        return response.payload.data.decode("UTF-8")
+        value = response.payload.data.decode("UTF-8")
+
+        # Pinned versions are immutable; aliases such as 'latest' may be rotated
+        expires_at = None
+        if not secret_name.rsplit("/", 1)[-1].isdigit():
+            expires_at = time.monotonic() + config.SECRET_CACHE_TTL
+
+        with Secrets._lock:
+            Secrets._cache[secret_name] = (expires_at, value)
+        return value
@@ -16,14 +16,14 @@ from typing import Any, Tuple
 
 import flask
 
-from .handlers.bigquery import BigQueryRoutineRequest
-from .handlers.cloud_task import CloudTaskRequest
 from .logger import logger
 from .models.enums.request_source import Sources
+from .tracing import Tracer
 from .utils import Utils
 
 
 class Handler:
+    # Each source's handler, and the client libraries it needs, is imported on first use
     @staticmethod
     def execute(request: flask.Request) -> Tuple[Any, int]:
         req_json = request.get_json(silent=True)
@@ -32,15 +32,24 @@ class Handler:
 
         source = Utils.get_property(req_json, "source") or Sources.BIGQUERY_ROUTINE.name
         try:
-            match (Sources[source]):
-                case Sources.BIGQUERY_ROUTINE:
-                    (res, _) = BigQueryRoutineRequest.execute(req_json)
-                    return res, 200
-                case Sources.CLOUD_TASK:
-                    (res, _) = CloudTaskRequest.execute(req_json)
-                    return res, 202  # This status code avoids retries by Cloud Tasks.
+            # Cloud Tasks forward the trace context of the invocation that enqueued them
+            with Tracer.span(
+                "handler.execute", traceparent=request.headers.get("traceparent"), source=source
+            ):
+                match (Sources[source]):
+                    case Sources.BIGQUERY_ROUTINE:
+                        from .handlers.bigquery import BigQueryRoutineRequest
+
+                        (res, _) = BigQueryRoutineRequest.execute(req_json)
+                        return res, 200
+                    case Sources.CLOUD_TASK:
+                        from .handlers.cloud_task import CloudTaskRequest
+
+                        (res, _) = CloudTaskRequest.execute(req_json)
+                        return res, 202  # This status code avoids retries by Cloud Tasks.
         except KeyError as ke:
             msg = f"Source of type '{source}' is not supported."
             logger.error(msg)
 
             return msg, 422
+
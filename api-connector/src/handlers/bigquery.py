@@ -12,128 +12,226 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import hashlib
 import json
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from typing import Any, Tuple
+from typing import Any, Dict, List, Tuple
 from urllib.parse import urlencode
 
-from google.cloud import tasks_v2
-
 from ..config import config
 from ..logger import logger
+from ..tasks import Tasks
+from ..tracing import Tracer
 from ..utils import Utils
+from ..writer import BigQueryWriter
 
 
 class BigQueryRoutineRequest:
+    # Payload fields that differ between the rows sharing a Cloud Task
+    ROW_FIELDS = ("headers", "query_string", "body", "request_key")
+
     @staticmethod
     def execute(request: Any) -> Tuple[Any, int]:
         logger.debug("BigQuery Routine request received.")
 
         calls = Utils.get_property(request, "calls", required=True)
-        replies = []
-
-        for bq_args in calls:
-            logger.debug(bq_args)
-
-            # The following arguments are received from the BigQuery Routine, in order:
-            expected_args = {
-                "workflow_id": None,
-                "request_config": None,
-                "auth": None,
-                "headers": None,
-                "query_string": None,
-                "body": None,
-                "result_table": None,
-                "queue_name": None,
+
+        replies: List[Any] = [None] * len(calls)
+        parsed: Dict[int, Tuple[Dict[str, Any], Dict[str, Any]]] = {}
+        with Tracer.span("bigquery_routine.parse", calls=len(calls)):
+            for i, bq_args in enumerate(calls):
+                try:
+                    parsed[i] = BigQueryRoutineRequest._parse(bq_args)
+                except (IndexError, KeyError) as ke:
+                    replies[i] = {
+                        "error": f"Unable to parse BigQuery Routine arguments. Are there missing parameters? {ke}"
+                    }
+                    logger.error(replies[i])
+
+        # Tasks are enqueued (or, in direct mode, APIs called) concurrently; replies are
+        # kept in `calls` order, which is what BigQuery expects from a remote function.
+        # Rows for the whole batch are written with a single streaming insert.
+        batches = BigQueryRoutineRequest._batch(parsed)
+        workers = config.ENQUEUE_WORKERS
+        direct = [
+            payload
+            for (_, payload) in parsed.values()
+            if BigQueryRoutineRequest._is_direct(payload)
+        ]
+        if direct:
+            workers = int(
+                Utils.get_property(direct[0]["request_config"], "max_concurrent") or workers
+            )
+
+        def dispatch(batch: List[int], writer: BigQueryWriter) -> Any:
+            rows = [parsed[i] for i in batch]
+            if BigQueryRoutineRequest._is_direct(rows[0][1]):
+                return BigQueryRoutineRequest._call(rows[0][1], writer)
+            return BigQueryRoutineRequest._enqueue(rows, writer)
+
+        from .cloud_task import CloudTaskRequest
+
+        writer = BigQueryWriter()
+        with ThreadPoolExecutor(max_workers=max(1, min(workers, len(batches)))) as executor:
+            for batch, reply in zip(
+                batches,
+                executor.map(Tracer.wrap(lambda batch: dispatch(batch, writer)), batches),
+            ):
+                for i in batch:
+                    replies[i] = reply
+
+        # Direct calls also write results and bodies, handled as for a Cloud Task request
+        CloudTaskRequest._flush(writer)
+
+        return json.dumps({"replies": replies}), 200
+
+    @staticmethod
+    def request_key(headers: Any, query_string: Any, body: Any) -> str:
+        """
+        Identifies a request by the raw argument strings it was built from. The DAG
+        computes the same key in SQL to join results back to every source row.
+        """
+        raw = "\n".join(value or "" for value in (headers, query_string, body))
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def _is_direct(payload: Dict[str, Any]) -> bool:
+        # The DAG copies api_config's dispatch_mode into the request configuration
+        request_config = payload["request_config"]
+        return (
+            isinstance(request_config, dict)
+            and Utils.get_property(request_config, "dispatch_mode") == "direct"
+        )
+
+    @staticmethod
+    def _parse(bq_args: Any) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+        logger.debug("BigQuery Routine arguments: %s", bq_args)
+
+        # The following arguments are received from the BigQuery Routine, in order:
+        expected_args = {
+            "workflow_id": None,
+            "request_config": None,
+            "auth": None,
+            "headers": None,
+            "query_string": None,
+            "body": None,
+            "result_table": None,
+            "queue_name": None,
+        }
+
+        # This is what the CLOUD_TASK routine expects
+        payload = {
+            "workflow_id": None,
+            "request_config": None,
+            "headers": None,
+            "query_string": None,
+            "auth": None,
+            "body": None,
+            "result_table": None,
+            "queue_name": None,
+            "request_key": None,
+            "source": "CLOUD_TASK",
+        }
+
+        for i, arg in enumerate(expected_args.keys()):
+            expected_args[arg] = bq_args[i]
+            if arg in payload.keys():
+                try:
+                    payload[arg] = json.loads(bq_args[i])
+                except:
+                    payload[arg] = bq_args[i]
+
+        payload["request_key"] = BigQueryRoutineRequest.request_key(
+            expected_args["headers"], expected_args["query_string"], expected_args["body"]
+        )
+
+        # Fix query strings
+        payload["query_string"] = urlencode(payload["query_string"])  # type: ignore
+
+        return expected_args, payload
+
+    @staticmethod
+    def _batch(parsed: Dict[int, Tuple[Dict[str, Any], Dict[str, Any]]]) -> List[List[int]]:
+        """
+        Groups the rows that only differ by their request arguments (same workflow,
+        configuration, credentials and queue) into batches of up to `rows_per_task`.
+        """
+        groups: Dict[str, List[List[int]]] = {}
+        for i, (_, payload) in parsed.items():
+            rows_per_task = int(
+                Utils.get_property(payload["request_config"], "rows_per_task") or 1
+            )
+            if BigQueryRoutineRequest._is_direct(payload):
+                rows_per_task = 1
+            shared = {
+                k: v for k, v in payload.items() if k not in BigQueryRoutineRequest.ROW_FIELDS
             }
+            batches = groups.setdefault(json.dumps(shared, sort_keys=True, default=str), [[]])
+            if len(batches[-1]) >= rows_per_task:
+                batches.append([])
+            batches[-1].append(i)
+
+        return [batch for batches in groups.values() for batch in batches]
 
-            # This is what the CLOUD_TASK routine expects
+    @staticmethod
+    def _enqueue(
+        rows: List[Tuple[Dict[str, Any], Dict[str, Any]]], writer: BigQueryWriter
+    ) -> Any:
+        (expected_args, payload) = rows[0]
+        if len(rows) > 1:
+            # One task carries the request arguments of every row in the batch
             payload = {
-                "workflow_id": None,
-                "request_config": None,
-                "headers": None,
-                "query_string": None,
-                "auth": None,
-                "body": None,
-                "result_table": None,
-                "source": "CLOUD_TASK",
+                **{
+                    k: v for k, v in payload.items() if k not in BigQueryRoutineRequest.ROW_FIELDS
+                },
+                "requests": [
+                    {k: row_payload[k] for k in BigQueryRoutineRequest.ROW_FIELDS}
+                    for (_, row_payload) in rows
+                ],
             }
 
-            try:
-                for i, arg in enumerate(expected_args.keys()):
-                    expected_args[arg] = bq_args[i]
-                    if arg in payload.keys():
-                        try:
-                            payload[arg] = json.loads(bq_args[i])
-                        except:
-                            payload[arg] = bq_args[i]
-            except KeyError as ke:
-                log_info = {
-                    "error": f"Unable to parse BigQuery Routine arguments. Are there missing parameters? {ke}"
-                }
-                logger.error(log_info)
-                replies.append(log_info)
-                continue
-
-            # Fix query strings
-            payload["query_string"] = urlencode(payload["query_string"])  # type: ignore
-
-            # Get log table
-            log_table = expected_args["result_table"].replace("tbl_result", "tbl_process_log")  # type: ignore
-
-            try:
-                taskClient = tasks_v2.CloudTasksClient()
-
-                function_uri = f"https://{config.REGION}-{config.PROJECT_ID}.cloudfunctions.net/{config.FUNCTION_NAME}"
-
-                task_descriptor = tasks_v2.Task(
-                    http_request=tasks_v2.HttpRequest(
-                        http_method=tasks_v2.HttpMethod.POST,
-                        url=function_uri,
-                        headers={"Content-type": "application/json"},
-                        body=json.dumps(payload).encode() if payload else None,
-                    )
-                )
-
-                logger.debug(
-                    {"parent": expected_args["queue_name"], "task": task_descriptor}
-                )
-
-                task = taskClient.create_task(
-                    request={
-                        "parent": expected_args["queue_name"],
-                        "task": task_descriptor,
-                    }
-                )
-                logger.info(f"Created task: {task.name}")
-
-                log_info = {"response": "Request added to the queue."}
-                Utils.save_bigquery(
-                    log_table,
-                    {
-                        "query_string": expected_args["query_string"],
-                        "headers": expected_args["headers"],
-                        "body": expected_args["body"],
-                        "result": json.dumps(log_info),
-                        "exec_time": f"{datetime.now().isoformat()}",
-                    },
-                )
-                replies.append(log_info)
-
-            except Exception as e:
-                logger.error(e)
-                log_info = {"error": f"Error adding request to the queue: {e}"}
-
-                Utils.save_bigquery(
-                    log_table,
-                    {
-                        "query_string": expected_args["query_string"],
-                        "headers": expected_args["headers"],
-                        "body": expected_args["body"],
-                        "result": json.dumps(log_info),
-                        "exec_time": f"{datetime.now().isoformat()}",
-                    },
-                )
-
-                replies.append(log_info)
-        return json.dumps({"replies": replies}), 200
+        # Get log table
+        log_table = expected_args["result_table"].replace("tbl_result", "tbl_process_log")  # type: ignore
+
+        try:
+            with Tracer.span("bigquery_routine.enqueue", rows=len(rows)):
+                Tasks.enqueue(expected_args["queue_name"], payload)  # type: ignore
+            log_info = {"response": "Request added to the queue."}
+        except Exception as e:
+            logger.error(e)
+            log_info = {"error": f"Error adding request to the queue: {e}"}
+
+        for (row_args, _) in rows:
+            writer.add(
+                log_table,
+                {
+                    "query_string": row_args["query_string"],
+                    "headers": row_args["headers"],
+                    "body": row_args["body"],
+                    "result": json.dumps(log_info),
+                    "exec_time": f"{datetime.now().isoformat()}",
+                },
+            )
+
+        return log_info
+
+    @staticmethod
+    def _call(payload: Dict[str, Any], writer: BigQueryWriter) -> Any:
+        """
+        Calls the API inline, bypassing Cloud Tasks, and replies with its response.
+        Results and process log rows are written as for a Cloud Task request.
+        """
+        from .cloud_task import CloudTaskRequest
+
+        try:
+            # Without a queue, retries and pagination can't be handed over to a new task
+            (res, _) = CloudTaskRequest.execute({**payload, "queue_name": None}, writer)
+        except Exception as e:
+            logger.error(e)
+            return {"error": f"Error calling the API: {e}"}
+
+        try:
+            return json.loads(res)
+        except (TypeError, ValueError):
+            return res
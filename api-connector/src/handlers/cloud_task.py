@@ -13,19 +13,33 @@
 # limitations under the License.
 
 import json
-from datetime import datetime
-from typing import Any, Tuple
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
 
 import requests
 
-from google.cloud import pubsub_v1
-
-from ..auth import TokenAuth
+from ..auth import TokenAuth, TokenCache, TokenRequestError
+from ..body_codec import BodyCodec, BodyIndex
+from ..extraction import Extractor
 from ..gsecrets import Secrets
 from ..logger import logger
 from ..models.enums.auth_type import AuthType
+from ..pagination import Paginator
+from ..publisher import Publication, Publisher
+from ..rate_limit import RateLimiter
+from ..response_body import ResponseBody
+from ..runtime import Background
+from ..response_cache import ResponseCache
+from ..retry import RetryPolicy
+from ..sessions import Sessions
+from ..storage import Storage
+from ..tasks import Tasks
+from ..tracing import Tracer
 from ..utils import Utils
 from ..config import config
+from ..writer import BigQueryWriter
 
 
 class CloudTaskRequest:
@@ -39,8 +53,8 @@ class CloudTaskRequest:
         timeout: int,
         headers: Any,
         method: str,
-    ):
-        logger.debug(f"{method.upper()} '{uri}'...")
+    ) -> Tuple[requests.Response, Dict[str, float]]:
+        logger.debug("%s '%s'...", method.upper(), uri)
 
         auth_payload = None
 
@@ -50,15 +64,9 @@ class CloudTaskRequest:
             case AuthType.HTTP_BASIC:
                 auth_payload = (credentials[0], credentials[1])
 
-        request_matcher = {
-            "get": requests.get,
-            "post": requests.post,
-            "put": requests.put,
-            "delete": requests.delete,
-        }
-
-        if method.lower() in request_matcher.keys():
-            return request_matcher[method.lower()](
+        if method.lower() in Sessions.SUPPORTED_METHODS:
+            return Sessions.request(
+                method,
                 uri,
                 allow_redirects=True,
                 auth=auth_payload,
@@ -66,6 +74,7 @@ class CloudTaskRequest:
                 headers=headers,
                 params=query_string,
                 timeout=timeout,
+                stream=True,
             )
         else:
             msg = f"HTTP Method '{method}' is not supported."
@@ -73,9 +82,13 @@ class CloudTaskRequest:
             raise Exception(msg)
 
     @staticmethod
-    def execute(request: Any) -> Tuple[Any, int]:
+    def execute(request: Any, writer: Optional[BigQueryWriter] = None) -> Tuple[Any, int]:
         logger.debug("Cloud Task request received.")
 
+        batch = Utils.get_property(request, "requests")
+        if batch:
+            return CloudTaskRequest.execute_batch(request, batch)
+
         workflow_id = Utils.get_property(request, "workflow_id")
 
         logger.debug("Processing authentication type...")
@@ -86,8 +99,9 @@ class CloudTaskRequest:
         if auth:
             try:
                 secret_name = Utils.get_property(auth, "secret_name", required=True)
-                secret_data = json.loads(Secrets.get_value(secret_name))
-                logger.info(f"Obtained secret authentication data for '{secret_name}'")
+                with Tracer.span("cloud_task.secret"):
+                    secret_data = json.loads(Secrets.get_value(secret_name))
+                logger.info("Obtained secret authentication data for '%s'", secret_name)
             except Exception as e:
                 return f"Could not retrieve secret: {e}", 500
 
@@ -96,8 +110,6 @@ class CloudTaskRequest:
 
                 match (AuthType[auth_type]):
                     case AuthType.CLIENT_CREDENTIALS:
-                        logger.debug("Requesting credentials from server...")
-
                         auth_server = Utils.get_property(
                             auth, "auth_server", required=True
                         )
@@ -106,24 +118,14 @@ class CloudTaskRequest:
                             secret_data, "client_secret", required=True
                         )
 
-                        token_res = requests.post(
-                            url=auth_server,
-                            data={"grant_type": "client_credentials"},
-                            allow_redirects=False,
-                            auth=(client_id, client_secret),
-                        )
-
-                        if token_res.status_code != 200:
-                            msg = f"Failed to obtain token from the OAuth 2.0 server: {token_res.text}"
-                            logger.error(msg)
-                            return msg, 500
-
-                        access_token = Utils.get_property(
-                            token_res.json(), "access_token", required=True
-                        )
-                        credentials = access_token
-
-                        logger.debug("Success.")
+                        try:
+                            with Tracer.span("cloud_task.oauth_token"):
+                                credentials = TokenCache.get(
+                                    auth_server, client_id, client_secret
+                                )
+                        except TokenRequestError as e:
+                            logger.error(str(e))
+                            return str(e), 500
 
                     case AuthType.HTTP_BASIC:
                         logger.debug(
@@ -143,7 +145,7 @@ class CloudTaskRequest:
                 return msg, 422
 
             logger.info(
-                f"Credential processing complete. Will use authentication type '{auth_type}'."
+                "Credential processing complete. Will use authentication type '%s'.", auth_type
             )
 
         request_config = Utils.get_property(request, "request_config", required=True)
@@ -155,84 +157,504 @@ class CloudTaskRequest:
         body = Utils.get_property(request, "body")
         headers = Utils.get_property(request, "headers")
         query_string = Utils.get_property(request, "query_string")
+        queue_name = Utils.get_property(request, "queue_name")
+        request_key = Utils.get_property(request, "request_key")
         result_table = Utils.get_property(request, "result_table").replace(
             "tbl_process_log", "tbl_result"
         )
         log_table = result_table.replace("tbl_result", "tbl_process_log")
+        body_table = result_table.replace("tbl_result", "tbl_result_body")
+        records_table = Extractor.table(result_table, workflow_id)
+        # Runs share the records table: each row names the run it comes from
+        run_id = result_table.rsplit("tbl_result_", 1)[-1]
 
         rpl = result_table.replace("tbl_process_log", "*").replace("tbl_result", "*")
-        logger.info(f"Results will be sent to '{rpl}'.")
-
-        res = CloudTaskRequest.api_call(
-            uri,
-            AuthType[auth_type],
-            credentials,
-            query_string,
-            body,
-            timeout,
-            headers,
-            method,
+        logger.info("Results will be sent to '%s'.", rpl)
+
+        paginator = Paginator.from_config(
+            request_config, Utils.get_property(request, "pagination_state")
+        )
+        retry_policy = RetryPolicy.from_config(request_config)
+        response_config = Utils.get_property(request_config, "response_config") or {}
+        offload_threshold = (
+            Utils.get_property(response_config, "offload_threshold_bytes")
+            or config.OFFLOAD_THRESHOLD_BYTES
         )
+        body_encoding = Utils.get_property(response_config, "body_encoding") or "none"
+        if body_encoding not in BodyCodec.ENCODINGS:
+            raise ValueError(f"Body encoding '{body_encoding}' is not supported.")
+        dedup_bodies = bool(Utils.get_property(response_config, "dedup_bodies"))
+        response_cache = ResponseCache.from_config(response_config)
+        extractor = Extractor.from_config(response_config)
+        attempt = Utils.get_property(request, "attempt") or 1
+        started = time.monotonic()
+        started_at = datetime.now(timezone.utc)
+        metrics_table = result_table.replace("tbl_result", "tbl_run_metrics")
+        run_metrics = {
+            "attempts": 0,
+            "pages": 0,
+            "response_bytes": 0,
+            "upstream_time": 0.0,
+            "bq_write_time": 0.0,
+            "publish_failures": 0,
+            "records": 0,
+        }
+        topics = Publisher.topics(workflow_id)
+        publications: List[Publication] = []
+        # Messages sharing an ordering key (a request's pages, or a workflow) keep their order
+        ordering_key = {"request": request_key, "workflow": workflow_id}.get(
+            Utils.get_property(response_config, "pubsub_ordering")
+        ) or ""
+
+        def call_api(page_uri, page_query_string, extra_headers):
+            nonlocal credentials
+
+            RateLimiter.acquire(workflow_id, request_config)
+            res, timing = CloudTaskRequest.api_call(
+                page_uri,
+                AuthType[auth_type],
+                credentials,
+                page_query_string,
+                body,
+                timeout,
+                {**(headers or {}), **extra_headers} if extra_headers else headers,
+                method,
+            )
 
-        # Persist response on BigQuery
-        Utils.save_bigquery(
-            result_table,
-            {
-                "request": {
-                    "uri": uri,
-                    "method": method,
-                    "auth_type": auth_type,
-                    "query_string": query_string,
-                    "body": json.dumps(body),
+            if res.status_code == 401 and AuthType[auth_type] == AuthType.CLIENT_CREDENTIALS:
+                # The cached token may have been revoked before its expiry: retry once with a new one
+                logger.info("Upstream API rejected the access token, requesting a new one...")
+                res.close()
+                TokenCache.invalidate(auth_server, client_id, credentials)  # type: ignore
+                credentials = TokenCache.get(auth_server, client_id, client_secret)  # type: ignore
+
+                RateLimiter.acquire(workflow_id, request_config)
+                res, timing = CloudTaskRequest.api_call(
+                    page_uri,
+                    AuthType[auth_type],
+                    credentials,
+                    page_query_string,
+                    body,
+                    timeout,
+                    {**(headers or {}), **extra_headers} if extra_headers else headers,
+                    method,
+                )
+            return res, timing
+
+        def reenqueue(delay=None, **changes):
+            if paginator:
+                changes["pagination_state"] = paginator.state
+            Tasks.enqueue(queue_name, {**request, **changes}, delay=delay)
+
+        def flush():
+            # A shared writer is flushed by its owner
+            if owns_writer:
+                flush_started = time.monotonic()
+                with Tracer.span("cloud_task.bigquery_write"):
+                    CloudTaskRequest._flush(writer)  # type: ignore
+                run_metrics["bq_write_time"] += time.monotonic() - flush_started
+
+        def finish(outcome, status_code=None):
+            # Confirms Pub/Sub messages and writes the remaining rows, then the metrics row
+            if publications:
+                with Tracer.span("cloud_task.pubsub_wait", messages=len(publications)):
+                    run_metrics["publish_failures"] = Publisher.wait(publications)
+            flush()
+            if not config.RUN_METRICS:
+                return
+            enqueued_at = Utils.get_property(request, "enqueued_at")
+            writer.add(  # type: ignore
+                metrics_table,
+                {
+                    "workflow_id": workflow_id,
+                    "request_key": request_key,
+                    "outcome": outcome,
+                    "status_code": status_code,
+                    "enqueued_at": enqueued_at,
+                    "started_at": started_at.isoformat(),
+                    "finished_at": datetime.now(timezone.utc).isoformat(),
+                    "queue_wait_time": (
+                        (started_at - datetime.fromisoformat(enqueued_at)).total_seconds()
+                        if enqueued_at
+                        else None
+                    ),
+                    **run_metrics,
+                },
+            )
+            flush()
+
+        # Result and log rows are buffered and written once each page is done
+        owns_writer = writer is None
+        writer = writer or BigQueryWriter()
+        pending_flush = None
+
+        while True:
+            (page_uri, page_query_string) = (
+                paginator.next_request(uri, query_string) if paginator else (uri, query_string)
+            )
+
+            # A fresh cached response replaces the call; a stale one is revalidated
+            cache_key, cached, cache_hit = None, None, False
+            if response_cache:
+                cache_key = ResponseCache.key(
+                    workflow_id, page_uri, method, page_query_string, body, headers
+                )
+                cached = response_cache.get(cache_key)
+                cache_hit = ResponseCache.is_fresh(cached)
+            if cache_hit:
+                res = ResponseCache.to_response(cached)  # type: ignore
+                timing = {"connect_time": 0.0, "tls_time": 0.0, "server_time": 0.0}
+
+            while not cache_hit:
+                res, error = None, None
+                call_started = time.monotonic()
+                try:
+                    with Tracer.span(
+                        "cloud_task.upstream_call", uri=page_uri, attempt=attempt
+                    ) as span:
+                        res, timing = call_api(
+                            page_uri, page_query_string, ResponseCache.conditional_headers(cached)
+                        )
+                        span.set("status_code", res.status_code)
+                except TokenRequestError as e:
+                    logger.error(str(e))
+                    writer.add(
+                        log_table,
+                        {
+                            "query_string": page_query_string,
+                            "body": json.dumps(body),
+                            "result": json.dumps(
+                                {"error_message": str(e), "key": request_key, "final": True}
+                            ),
+                            "exec_time": f"{datetime.now().isoformat()}",
+                        },
+                    )
+                    finish("failed")
+                    return str(e), 500
+                except requests.RequestException as e:
+                    error = e
+                finally:
+                    run_metrics["attempts"] += 1
+                    run_metrics["upstream_time"] += time.monotonic() - call_started
+
+                wait = None
+                if retry_policy.should_retry(attempt, res, error):
+                    wait = retry_policy.delay(attempt, res)
+                    if wait > retry_policy.max_inline_wait and not queue_name:
+                        # Direct calls have no queue to hand a long wait to, and sleeping
+                        # would hold the routine call: this attempt's outcome is final
+                        logger.warning("Not retrying: a %.1fs wait needs a queue.", wait)
+                        wait = None
+
+                if wait is None:
+                    if error is not None and retry_policy.max_attempts > 1:
+                        # The retries are used up: a failed task would be run again by Cloud
+                        # Tasks, from the first attempt, so the failure is final instead
+                        logger.error("Giving up after %s attempts: %s", attempt, error)
+                        writer.add(
+                            log_table,
+                            {
+                                "query_string": page_query_string,
+                                "body": json.dumps(body),
+                                "result": json.dumps(
+                                    {
+                                        "attempt": attempt,
+                                        "error_message": str(error),
+                                        "key": request_key,
+                                        "final": True,
+                                    }
+                                ),
+                                "exec_time": f"{datetime.now().isoformat()}",
+                            },
+                        )
+                        finish("failed")
+                        return f"Giving up after {attempt} attempts: {error}", 202
+                    if error is not None:
+                        finish("failed")
+                        raise error
+                    break
+
+                if res is not None:
+                    res.close()
+
+                log_info = {"attempt": attempt, "retry_in": round(wait, 3)}
+                if error is not None:
+                    log_info["error_message"] = str(error)
+                else:
+                    log_info["status_code"] = res.status_code  # type: ignore
+                if paginator:
+                    log_info["page"] = paginator.page
+
+                logger.warning(
+                    "Attempt %s of %s failed: %s", attempt, retry_policy.max_attempts, log_info
+                )
+                writer.add(
+                    log_table,
+                    {
+                        "query_string": page_query_string,
+                        "body": json.dumps(body),
+                        "result": json.dumps(log_info),
+                        "exec_time": f"{datetime.now().isoformat()}",
+                    },
+                )
+
+                if wait > retry_policy.max_inline_wait:
+                    # Long waits are handed back to Cloud Tasks instead of holding the instance
+                    reenqueue(wait, attempt=attempt + 1)
+                    finish("retry_scheduled", res.status_code if res is not None else None)
+                    return f"Retry {attempt + 1} scheduled in {wait:.1f}s.", 202
+
+                time.sleep(wait)
+                attempt += 1
+
+            if response_cache and cached and res.status_code == 304:  # type: ignore
+                logger.debug("Cached response is still valid.")
+                res.close()  # type: ignore
+                response_cache.refresh(cache_key, cached, res)  # type: ignore
+                res = ResponseCache.to_response(cached)
+                cache_hit = True
+
+            # The body is streamed to a temporary file; large ones are offloaded to GCS
+            body_started = time.monotonic()
+            with Tracer.span("cloud_task.response_body", cache_hit=cache_hit) as span:
+                res_body = ResponseBody(res)
+                span.set("size", res_body.size)
+            if not cache_hit:
+                run_metrics["upstream_time"] += time.monotonic() - body_started
+            run_metrics["pages"] += 1
+            run_metrics["response_bytes"] += res_body.size
+            offload = res_body.size > offload_threshold
+            if offload and not config.LOD_GCS_STAGING:
+                # Without a staging location (e.g. local runs), large bodies stay inline
+                logger.warning(
+                    "Response of %s bytes kept inline: LOD_GCS_STAGING is not set.", res_body.size
+                )
+                offload = False
+            if offload:
+                with Tracer.span("cloud_task.offload", size=res_body.size):
+                    res_body.uri = Storage.upload(
+                        res_body.open(),
+                        f"api-connector/responses/{workflow_id}/{res_body.sha256}",
+                        res.headers.get("Content-Type"),
+                    )
+                logger.info("Response of %s bytes written to '%s'.", res_body.size, res_body.uri)
+            elif response_cache and not cache_hit and res_body.size <= offload_threshold:
+                response_cache.set(cache_key, res, res_body.read())  # type: ignore
+            res_text = None if res_body.offloaded else res_body.text()
+
+            # Bodies can be stored compressed, and/or once per distinct content
+            stored_body = res_text
+            if stored_body is not None and body_encoding != "none":
+                stored_body = BodyCodec.encode(res_body.read(), body_encoding)
+            if stored_body is not None and dedup_bodies:
+                if BodyIndex.add(body_table, res_body.sha256):
+                    writer.add(
+                        body_table,
+                        {
+                            "body_hash": res_body.sha256,
+                            "body_encoding": body_encoding,
+                            "body": stored_body,
+                        },
+                    )
+                stored_body = None
+
+            # Persist response on BigQuery
+            writer.add(
+                result_table,
+                {
+                    "request": {
+                        "uri": page_uri,
+                        "method": method,
+                        "auth_type": auth_type,
+                        "query_string": page_query_string,
+                        "body": json.dumps(body),
+                        "key": request_key,
+                    },
+                    "request_time": f"{datetime.now().isoformat()}",
+                    "elapsed_time": res.elapsed.total_seconds(),
+                    "timing": timing,
+                    "cache_hit": cache_hit,
+                    "response": {
+                        "status_code": res.status_code,
+                        "headers": json.dumps(dict(res.headers)),
+                        "body": stored_body,
+                        "body_encoding": body_encoding,
+                        "body_size": res_body.size,
+                        "body_hash": res_body.sha256,
+                        "body_uri": res_body.uri,
+                    },
                 },
-                "request_time": f"{datetime.now().isoformat()}",
-                "elapsed_time": res.elapsed.total_seconds(),
-                "response": {
+            )
+
+            page = paginator.page if paginator else None
+
+            # Records are parsed as the body is read back, and written as typed rows
+            extract_error = None
+            if extractor and 200 <= res.status_code < 300:
+                with Tracer.span("cloud_task.extract") as span:
+                    records = 0
+                    extracted_at = datetime.now(timezone.utc).isoformat()
+                    try:
+                        for row in extractor.rows(res_body.open()):
+                            row[Extractor.SOURCE_FIELD] = {
+                                "run_id": run_id,
+                                "request_key": request_key,
+                                "page": page,
+                                "record_index": records,
+                                "extracted_at": extracted_at,
+                            }
+                            writer.add(records_table, row)
+                            records += 1
+                    except Exception as e:
+                        logger.error("Could not extract records from the response: %s", e)
+                        extract_error = str(e)
+                    span.set("records", records)
+                run_metrics["records"] += records
+
+            more_pages = paginator is not None and paginator.advance(res, res_body)
+            truncated = (
+                more_pages
+                and not queue_name
+                and time.monotonic() - started > config.PAGINATION_TIME_BUDGET
+            )
+            if truncated:
+                # Direct calls can't continue in a new task: the pages read so far are
+                # the result, and the request is marked as truncated
+                logger.warning("Pagination stopped at page %s: time budget exceeded.", page)
+                more_pages = False
+
+            # Log results/status. The last row of a request is marked as final, which
+            # is what the DAG counts to detect the end of a run.
+            if res.status_code == 200:
+                log_info = {"status_code": res.status_code, "attempt": attempt}
+            else:
+                log_info = {
                     "status_code": res.status_code,
-                    "headers": json.dumps(dict(res.headers)),
-                    "body": res.text,
+                    "attempt": attempt,
+                    "error_message": res_text if res_text is not None else res_body.uri,
+                }
+            if paginator:
+                log_info["page"] = page
+            if extract_error:
+                log_info["extract_error"] = extract_error
+            if truncated:
+                log_info["truncated"] = True
+            log_info["key"] = request_key
+            log_info["final"] = not more_pages
+
+            writer.add(
+                log_table,
+                {
+                    "query_string": page_query_string,
+                    "body": json.dumps(body),
+                    "result": json.dumps(log_info),
+                    "exec_time": f"{datetime.now().isoformat()}",
                 },
-            },
-        )
+            )
 
-        # Send response to Pub/Sub, if configured
-        if config.PUBSUB_TOPICS:
-            topics = json.loads(config.PUBSUB_TOPICS)
-            topics = [[v for k, v in t.items() if k == workflow_id] for t in topics]
-            topic = next((x for xs in topics for x in xs), False)
-            if topic:
-                publisher = pubsub_v1.PublisherClient()
+            # Send response to Pub/Sub, if configured. Messages are sent in the background
+            # and confirmed before this invocation returns.
+            if topics:
+                logger.debug("Publishing response data from '%s' to %s...", workflow_id, topics)
+                with Tracer.span("cloud_task.pubsub_publish", topics=len(topics)):
+                    if res_body.offloaded:
+                        publications += Publisher.publish(
+                            topics,
+                            json.dumps(res_body.reference()).encode("utf-8"),
+                            ordering_key,
+                            offloaded="true",
+                        )
+                    else:
+                        publications += Publisher.publish(topics, res_body.read(), ordering_key)
+
+            # Each page is written as soon as it arrives, while the next step runs.
+            # Waiting for the previous write keeps at most one page in flight.
+            if pending_flush:
+                pending_flush.result()
+            pending_flush = Background.submit(flush)
+
+            if not more_pages:
+                break
+            res_body.close()
+
+            attempt = 1
+            if queue_name and time.monotonic() - started > config.PAGINATION_TIME_BUDGET:
+                # Hand the remaining pages to a new task before this one times out
+                pending_flush.result()
+                reenqueue(attempt=1)
+                finish("continued", res.status_code)
+                return f"Continuing from page {paginator.page} in a new task.", 202
+
+        pending_flush.result()  # type: ignore
+        finish("completed", res.status_code)
+
+        if paginator:
+            res_body.close()
+            return json.dumps({"pages": paginator.page, "bytes": paginator.state["bytes"]}), 202
+
+        # The body is returned as is, or as a reference when it was offloaded
+        res_out = json.dumps(res_body.reference()) if res_body.offloaded else res_text
+        res_body.close()
+
+        logger.debug("Response: %s", res_out)
+        return res_out, 202
 
-                logger.debug(
-                    f"Publishing response data from '{workflow_id}' to '{topic}'..."
+    @staticmethod
+    def execute_batch(request: Any, batch: List[Any]) -> Tuple[Any, int]:
+        """
+        Runs every request carried by a single task concurrently, over the same
+        sessions and credentials, and writes all of their rows together.
+        """
+        logger.info("Cloud Task carries %s requests.", len(batch))
+
+        shared = {k: v for k, v in request.items() if k != "requests"}
+        request_config = Utils.get_property(request, "request_config", required=True)
+        workers = int(
+            Utils.get_property(request_config, "batch_concurrency") or config.TASK_BATCH_WORKERS
+        )
+        log_table = (
+            Utils.get_property(request, "result_table")
+            .replace("tbl_process_log", "tbl_result")
+            .replace("tbl_result", "tbl_process_log")
+        )
+        writer = BigQueryWriter()
+
+        def run(item: Any) -> Dict[str, Any]:
+            try:
+                with Tracer.span("cloud_task.request", request_key=item.get("request_key")):
+                    (_, code) = CloudTaskRequest.execute({**shared, **item}, writer)
+                return {"request_key": item.get("request_key"), "status_code": code}
+            except Exception as e:
+                # One failed request must not fail, and retry, the whole batch
+                logger.error("Request '%s' failed: %s", item.get("request_key"), e)
+                writer.add(
+                    log_table,
+                    {
+                        "query_string": item.get("query_string"),
+                        "body": json.dumps(item.get("body")),
+                        "result": json.dumps(
+                            {
+                                "error_message": str(e),
+                                "key": item.get("request_key"),
+                                "final": True,
+                            }
+                        ),
+                        "exec_time": f"{datetime.now().isoformat()}",
+                    },
                 )
-                publisher.publish(str(topic), res.text.encode("utf-8"))
-                logger.debug("Done.")
+                return {"request_key": item.get("request_key"), "status_code": 500}
 
-        # Log results/status
-        if res.status_code == 200:
-            log_info = {"status_code": res.status_code}
-        else:
-            log_info = {"status_code": res.status_code, "error_message": res.text}
-
-        Utils.save_bigquery(
-            log_table,
-            {
-                "query_string": query_string,
-                "body": json.dumps(body),
-                "result": json.dumps(log_info),
-                "exec_time": f"{datetime.now().isoformat()}",
-            },
-        )
+        with ThreadPoolExecutor(max_workers=max(1, min(workers, len(batch)))) as executor:
+            results = list(executor.map(Tracer.wrap(run), batch))
 
-        # logger.debug(f"Got response: {res_json}")
-        ctype_header = res.headers.get("Content-Type")
-        res_out = ""
+        with Tracer.span("cloud_task.bigquery_write"):
+            CloudTaskRequest._flush(writer)
 
-        if ctype_header and ctype_header.startswith("application/json"):
-            res_out = json.dumps(res.json())
-        else:
-            res_out = res.text
+        return json.dumps(results), 202
 
-        logger.debug(res_out)
-        return res_out, 202
+    @staticmethod
+    def _flush(writer: BigQueryWriter):
+        for failure in writer.flush():
+            logger.error("Could not write row to '%s': %s", failure["table"], failure["errors"])
+            if "tbl_result_body" in failure["table"]:
+                BodyIndex.discard(failure["table"], failure["row"]["body_hash"])
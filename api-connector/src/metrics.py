@@ -0,0 +1,80 @@
+# Copyright 2022 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import json
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict
+
+from .config import config
+from .logger import logger
+
+
+class Metrics:
+    """Process-wide counters and timers, kept for the lifetime of a warm instance."""
+
+    _lock = threading.Lock()
+    _counters: Dict[str, int] = {}
+    _timers: Dict[str, Dict[str, float]] = {}
+    _reported = float("-inf")
+
+    @staticmethod
+    def increment(name: str, value: int = 1):
+        with Metrics._lock:
+            Metrics._counters[name] = Metrics._counters.get(name, 0) + value
+
+    @staticmethod
+    def observe(name: str, seconds: float):
+        with Metrics._lock:
+            timer = Metrics._timers.setdefault(
+                name, {"count": 0, "total": 0.0, "max": 0.0}
+            )
+            timer["count"] += 1
+            timer["total"] += seconds
+            timer["max"] = max(timer["max"], seconds)
+
+    @staticmethod
+    @contextmanager
+    def timer(name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            Metrics.observe(name, time.perf_counter() - start)
+
+    @staticmethod
+    def snapshot() -> Dict[str, Any]:
+        with Metrics._lock:
+            return {
+                "counters": dict(Metrics._counters),
+                "timers": {k: dict(v) for k, v in Metrics._timers.items()},
+                # Hit rate of each cache counting `<name>.hit` and `<name>.miss`
+                "hit_rates": {
+                    name[: -len(".hit")]: hits
+                    / (hits + Metrics._counters.get(name[: -len(".hit")] + ".miss", 0))
+                    for name, hits in Metrics._counters.items()
+                    if name.endswith(".hit") and hits
+                },
+            }
+
+    @staticmethod
+    def report():
+        """Logs the snapshot at INFO level, at most once every METRICS_LOG_INTERVAL seconds."""
+        now = time.monotonic()
+        with Metrics._lock:
+            if now - Metrics._reported < config.METRICS_LOG_INTERVAL:
+                return
+            Metrics._reported = now
+        logger.info("Metrics: %s", json.dumps(Metrics.snapshot()))
@@ -0,0 +1,150 @@
+# Copyright 2022 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from typing import Any, Dict, Optional, Tuple
+from urllib.parse import urlencode
+
+import requests
+
+from .config import config
+from .logger import logger
+from .response_body import ResponseBody
+
+
+class Paginator:
+    """
+    Walks the pages of an API response according to the `pagination` section of a
+    workflow's `request_config`. The position in the result set is kept in `state`,
+    which is JSON serializable so a partially read result set can be resumed later.
+    """
+
+    STRATEGIES = ["cursor", "link_header", "offset", "page_number"]
+
+    def __init__(self, settings: Any, state: Optional[Dict[str, Any]] = None):
+        self.strategy = settings.get("strategy")
+        if self.strategy not in Paginator.STRATEGIES:
+            raise ValueError(f"Pagination strategy '{self.strategy}' is not supported.")
+
+        self.settings = settings
+        self.max_pages = settings.get("max_pages") or config.PAGINATION_MAX_PAGES
+        self.max_bytes = settings.get("max_bytes") or config.PAGINATION_MAX_BYTES
+
+        self.state = state or {"page": 1, "bytes": 0}
+        match (self.strategy):
+            case "offset":
+                self.state.setdefault("offset", settings.get("start_offset") or 0)
+            case "page_number":
+                self.state.setdefault("page_number", settings.get("start_page") or 1)
+
+    @staticmethod
+    def from_config(request_config: Any, state: Optional[Dict[str, Any]] = None) -> Optional["Paginator"]:
+        settings = request_config.get("pagination")
+        return Paginator(settings, state) if settings else None
+
+    @property
+    def page(self) -> int:
+        return self.state["page"]
+
+    def next_request(self, uri: str, query_string: Optional[str]) -> Tuple[str, Optional[str]]:
+        """Returns the URI and query string of the current page."""
+        params = {}
+
+        match (self.strategy):
+            case "cursor":
+                if self.state.get("cursor"):
+                    params[self.settings.get("cursor_param") or "cursor"] = self.state["cursor"]
+            case "link_header":
+                # The link already carries every query parameter of the next page
+                if self.state.get("next_uri"):
+                    return self.state["next_uri"], None
+            case "offset":
+                params[self.settings.get("offset_param") or "offset"] = self.state["offset"]
+                if self.settings.get("limit"):
+                    params[self.settings.get("limit_param") or "limit"] = self.settings["limit"]
+            case "page_number":
+                params[self.settings.get("page_param") or "page"] = self.state["page_number"]
+                if self.settings.get("page_size"):
+                    params[self.settings.get("page_size_param") or "page_size"] = self.settings["page_size"]
+
+        if not params:
+            return uri, query_string
+        return uri, "&".join(filter(None, [query_string, urlencode(params)]))
+
+    def advance(self, res: requests.Response, body: ResponseBody) -> bool:
+        """
+        Records the page just received and moves to the next one. Returns False once
+        there are no more pages or a guard has been reached.
+        """
+        self.state["bytes"] += body.size
+        if res.status_code != 200:
+            return False
+
+        match (self.strategy):
+            case "cursor":
+                cursor = Paginator._get_path(Paginator._json(body), self.settings.get("cursor_path"))
+                if not cursor:
+                    return False
+                self.state["cursor"] = cursor
+            case "link_header":
+                next_uri = res.links.get("next", {}).get("url")
+                if not next_uri:
+                    return False
+                self.state["next_uri"] = next_uri
+            case "offset" | "page_number":
+                records = Paginator._get_path(
+                    Paginator._json(body), self.settings.get("records_path")
+                )
+                if not records or not isinstance(records, list):
+                    return False
+
+                if self.strategy == "offset":
+                    self.state["offset"] += len(records)
+                else:
+                    self.state["page_number"] += 1
+
+                # A short page is the last one, no need to request an empty page after it
+                limit = self.settings.get("limit") or self.settings.get("page_size")
+                if limit and len(records) < limit:
+                    return False
+
+        if self.state["page"] >= self.max_pages:
+            logger.warning("Stopped after %s pages (max_pages).", self.state["page"])
+            return False
+        if self.state["bytes"] >= self.max_bytes:
+            logger.warning("Stopped after %s bytes (max_bytes).", self.state["bytes"])
+            return False
+
+        self.state["page"] += 1
+        return True
+
+    @staticmethod
+    def _json(body: ResponseBody) -> Any:
+        try:
+            return body.json()
+        except ValueError:
+            return None
+
+    @staticmethod
+    def _get_path(obj: Any, path: Optional[str]) -> Any:
+        """Resolves a dotted path such as 'meta.next_cursor' in a parsed JSON document."""
+        for key in (path or "").split("."):
+            if not key:
+                continue
+            if isinstance(obj, dict):
+                obj = obj.get(key)
+            elif isinstance(obj, list) and key.isdigit() and int(key) < len(obj):
+                obj = obj[int(key)]
+            else:
+                return None
+        return obj
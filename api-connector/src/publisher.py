@@ -0,0 +1,89 @@
+# Copyright 2022 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import gzip
+import json
+from concurrent.futures import Future
+from typing import Dict, List, Optional, Tuple
+
+from .clients import Clients
+from .config import config
+from .logger import logger
+from .metrics import Metrics
+
+# (topic, future, ordering key) of a message handed over to the publisher client
+Publication = Tuple[str, Future, str]
+
+
+class Publisher:
+    """
+    Publishes responses to the Pub/Sub topics of their workflow. Messages are
+    batched by the shared publisher client and sent in the background; callers
+    keep the returned publications and `wait` for them before returning.
+    """
+
+    @staticmethod
+    def index(topics: Optional[str]) -> Dict[str, List[str]]:
+        """
+        Maps each workflow to its topics, from a JSON list of `{workflow: topic}`
+        objects. A workflow may appear several times, or map to a list of topics.
+        """
+        index: Dict[str, List[str]] = {}
+        for mapping in json.loads(topics) if topics else []:
+            for workflow_id, topic in mapping.items():
+                index.setdefault(workflow_id, []).extend(
+                    topic if isinstance(topic, list) else [topic]
+                )
+        return index
+
+    _topics: Dict[str, List[str]] = index(config.PUBSUB_TOPICS)
+
+    @staticmethod
+    def topics(workflow_id: str) -> List[str]:
+        return Publisher._topics.get(workflow_id, [])
+
+    @staticmethod
+    def publish(
+        topics: List[str], data: bytes, ordering_key: str = "", **attributes: str
+    ) -> List[Publication]:
+        if len(data) > config.PUBSUB_COMPRESS_THRESHOLD:
+            data = gzip.compress(data)
+            attributes["content_encoding"] = "gzip"
+
+        publisher = Clients.publisher()
+        return [
+            (
+                topic,
+                publisher.publish(topic, data, ordering_key=ordering_key, **attributes),
+                ordering_key,
+            )
+            for topic in topics
+        ]
+
+    @staticmethod
+    def wait(publications: List[Publication]) -> int:
+        """Waits until every message is sent, and returns the number that failed."""
+        failed = 0
+        for topic, future, ordering_key in publications:
+            try:
+                future.result(timeout=config.PUBSUB_PUBLISH_TIMEOUT)
+                Metrics.increment("pubsub.published")
+            except Exception as e:
+                failed += 1
+                Metrics.increment("pubsub.failed")
+                logger.error("Could not publish to '%s': %s", topic, e)
+                if ordering_key:
+                    # Publishing with an ordering key is paused after a failure until resumed
+                    Clients.publisher().resume_publish(topic, ordering_key)
+        return failed
@@ -0,0 +1,77 @@
+# Copyright 2022 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import threading
+import time
+from typing import Any, Dict
+
+from .metrics import Metrics
+
+
+class TokenBucket:
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = max(1.0, burst)
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> float:
+        """Blocks until a token is available and returns the time spent waiting."""
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return waited
+                wait = (1 - self._tokens) / self.rate
+
+            time.sleep(wait)
+            waited += wait
+
+
+class RateLimiter:
+    """
+    Per-workflow token buckets enforcing `request_config.max_dispatch` (requests per
+    second) and `request_config.max_burst` on this instance. The Cloud Tasks queue
+    limits the whole workflow; this is a second guard for calls made by the connector.
+    """
+
+    _lock = threading.Lock()
+    _buckets: Dict[str, TokenBucket] = {}
+
+    @staticmethod
+    def acquire(workflow_id: str, request_config: Any) -> float:
+        rate = request_config.get("max_dispatch")
+        if not rate:
+            return 0.0
+
+        burst = request_config.get("max_burst") or rate
+        key = f"{workflow_id}:{rate}:{burst}"
+
+        bucket = RateLimiter._buckets.get(key)
+        if bucket is None:
+            with RateLimiter._lock:
+                bucket = RateLimiter._buckets.setdefault(
+                    key, TokenBucket(float(rate), float(burst))
+                )
+
+        waited = bucket.acquire()
+        if waited:
+            Metrics.observe("rate_limit.wait_time", waited)
+        return waited
@@ -0,0 +1,73 @@
+# Copyright 2022 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import hashlib
+import json
+import tempfile
+from typing import IO, Any, Optional
+
+import requests
+
+from .config import config
+
+
+class ResponseBody:
+    """
+    Body of a streamed upstream response, spooled to a temporary file (kept in memory
+    only while small) and hashed as it is read, so it is never held as a whole string.
+    """
+
+    CHUNK_SIZE = 64 * 1024
+
+    def __init__(self, res: requests.Response):
+        self.encoding = res.encoding or "utf-8"
+        self.uri: Optional[str] = None
+        self._file = tempfile.SpooledTemporaryFile(max_size=config.RESPONSE_SPOOL_SIZE)
+
+        sha256 = hashlib.sha256()
+        self.size = 0
+        try:
+            for chunk in res.iter_content(chunk_size=ResponseBody.CHUNK_SIZE):
+                self._file.write(chunk)
+                sha256.update(chunk)
+                self.size += len(chunk)
+        finally:
+            res.close()
+
+        self.sha256 = sha256.hexdigest()
+        self._file.seek(0)
+
+    @property
+    def offloaded(self) -> bool:
+        return self.uri is not None
+
+    def open(self) -> IO[bytes]:
+        """Returns the underlying file, rewound to the start of the body."""
+        self._file.seek(0)
+        return self._file  # type: ignore
+
+    def read(self) -> bytes:
+        return self.open().read()
+
+    def text(self) -> str:
+        return self.read().decode(self.encoding, errors="replace")
+
+    def json(self) -> Any:
+        return json.load(self.open())
+
+    def reference(self) -> Any:
+        return {"body_uri": self.uri, "body_size": self.size, "body_hash": self.sha256}
+
+    def close(self):
+        self._file.close()
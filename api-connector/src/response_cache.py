@@ -0,0 +1,200 @@
+# Copyright 2022 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import base64
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from datetime import timedelta
+from typing import Any, Dict, Optional
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+from .config import config
+from .metrics import Metrics
+
+
+class MemoryBackend:
+    """LRU cache local to this instance."""
+
+    def __init__(self, max_entries: int = config.RESPONSE_CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def set(self, key: str, entry: Dict[str, Any], retention: float):
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+class RedisBackend:
+    """Cache shared by every instance, backed by Memorystore for Redis (RESPONSE_CACHE_REDIS_URL)."""
+
+    PREFIX = "api-connector:response:"
+
+    def __init__(self, url: Optional[str] = config.RESPONSE_CACHE_REDIS_URL):
+        if not url:
+            raise KeyError("Environment variable 'RESPONSE_CACHE_REDIS_URL' must be set.")
+
+        import redis
+
+        self._client = redis.Redis.from_url(url)
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        value = self._client.get(RedisBackend.PREFIX + key)
+        if value is None:
+            return None
+
+        entry = json.loads(value)
+        entry["body"] = base64.b64decode(entry["body"])
+        return entry
+
+    def set(self, key: str, entry: Dict[str, Any], retention: float):
+        value = json.dumps({**entry, "body": base64.b64encode(entry["body"]).decode("ascii")})
+        self._client.set(RedisBackend.PREFIX + key, value, ex=max(1, int(retention)))
+
+
+class ResponseCache:
+    """
+    Cache of upstream responses keyed by a canonical hash of the request, configured
+    by the `cache` section of a workflow's `response_config`. Fresh entries are served
+    without calling the API; stale entries with an ETag or Last-Modified are
+    revalidated with a conditional request.
+    """
+
+    BACKENDS: Dict[str, Any] = {"memory": MemoryBackend, "redis": RedisBackend}
+
+    _lock = threading.Lock()
+    _backends: Dict[str, Any] = {}
+
+    def __init__(self, settings: Any):
+        self.ttl = float(settings.get("ttl") or 0)
+        self.backend = ResponseCache.get_backend(settings.get("backend") or "memory")
+
+    @staticmethod
+    def from_config(response_config: Any) -> Optional["ResponseCache"]:
+        settings = response_config.get("cache")
+        return ResponseCache(settings) if settings else None
+
+    @staticmethod
+    def get_backend(name: str) -> Any:
+        backend = ResponseCache._backends.get(name)
+        if backend is None:
+            with ResponseCache._lock:
+                backend = ResponseCache._backends.get(name)
+                if backend is None:
+                    if name not in ResponseCache.BACKENDS:
+                        raise ValueError(f"Cache backend '{name}' is not supported.")
+                    backend = ResponseCache._backends[name] = ResponseCache.BACKENDS[name]()
+        return backend
+
+    @staticmethod
+    def register_backend(name: str, backend: Any):
+        """Replaces the instance used for `name`, e.g. with a local stand-in."""
+        with ResponseCache._lock:
+            ResponseCache._backends[name] = backend
+
+    @staticmethod
+    def key(workflow_id: str, uri: str, method: str, query_string: Any, body: Any, headers: Any) -> str:
+        canonical = json.dumps(
+            [workflow_id, uri, method.upper(), query_string, body, headers or {}],
+            sort_keys=True,
+            separators=(",", ":"),
+            default=str,
+        )
+        return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        entry = self.backend.get(key)
+        Metrics.increment("response_cache.hit" if self.is_fresh(entry) else "response_cache.miss")
+        return entry
+
+    @staticmethod
+    def is_fresh(entry: Optional[Dict[str, Any]]) -> bool:
+        return entry is not None and time.time() < entry["expires_at"]
+
+    @staticmethod
+    def conditional_headers(entry: Optional[Dict[str, Any]]) -> Dict[str, str]:
+        headers = {}
+        if entry and entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry and entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def set(self, key: str, res: requests.Response, body: bytes):
+        """Stores a 200 response, unless its Cache-Control forbids it."""
+        ttl = self._ttl(res)
+        if res.status_code != 200 or ttl is None:
+            return
+
+        entry = {
+            "status_code": res.status_code,
+            "headers": dict(res.headers),
+            "encoding": res.encoding,
+            "etag": res.headers.get("ETag"),
+            "last_modified": res.headers.get("Last-Modified"),
+            "expires_at": time.time() + ttl,
+            "body": body,
+        }
+        # Entries are kept a while after expiry so they can be revalidated
+        self.backend.set(key, entry, ttl + config.RESPONSE_CACHE_STALE_TTL)
+
+    def refresh(self, key: str, entry: Dict[str, Any], res: requests.Response):
+        """Extends a revalidated entry after a 304 Not Modified."""
+        ttl = self._ttl(res) or 0
+        entry = {**entry, "expires_at": time.time() + ttl}
+        self.backend.set(key, entry, ttl + config.RESPONSE_CACHE_STALE_TTL)
+
+    def _ttl(self, res: requests.Response) -> Optional[float]:
+        """Freshness lifetime allowed by the workflow and the response's Cache-Control."""
+        directives = {}
+        for directive in (res.headers.get("Cache-Control") or "").split(","):
+            name, _, arg = directive.strip().partition("=")
+            if name:
+                directives[name.lower()] = arg.strip('"')
+
+        if "no-store" in directives:
+            return None
+        if "no-cache" in directives:
+            return 0
+        try:
+            return min(self.ttl, float(directives["max-age"]))
+        except (KeyError, ValueError):
+            return self.ttl
+
+    @staticmethod
+    def to_response(entry: Dict[str, Any]) -> requests.Response:
+        """Rebuilds a `requests.Response` from a cache entry."""
+        res = requests.Response()
+        res.status_code = entry["status_code"]
+        res.headers = CaseInsensitiveDict(entry["headers"])
+        res.encoding = entry.get("encoding")
+        res.elapsed = timedelta(0)
+        res._content = entry["body"]
+        res._content_consumed = True  # type: ignore
+        return res
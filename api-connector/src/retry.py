@@ -0,0 +1,92 @@
+# Copyright 2022 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import random
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Any, List, Optional
+
+import requests
+
+
+class RetryPolicy:
+    """
+    Retry settings of a workflow, read from the optional `retry` section of its
+    `request_config`. Without that section a request is attempted only once.
+    """
+
+    def __init__(
+        self,
+        max_attempts: int = 1,
+        initial_backoff: float = 1.0,
+        max_backoff: float = 60.0,
+        multiplier: float = 2.0,
+        jitter: bool = True,
+        retry_status_codes: List[int] = [429, 500, 502, 503, 504],
+        respect_retry_after: bool = True,
+        max_inline_wait: float = 10.0,
+    ):
+        self.max_attempts = max_attempts
+        self.initial_backoff = initial_backoff
+        self.max_backoff = max_backoff
+        self.multiplier = multiplier
+        self.jitter = jitter
+        self.retry_status_codes = retry_status_codes
+        self.respect_retry_after = respect_retry_after
+        self.max_inline_wait = max_inline_wait
+
+    @staticmethod
+    def from_config(request_config: Any) -> "RetryPolicy":
+        return RetryPolicy(**(request_config.get("retry") or {}))
+
+    def should_retry(
+        self,
+        attempt: int,
+        res: Optional[requests.Response],
+        error: Optional[Exception] = None,
+    ) -> bool:
+        if attempt >= self.max_attempts:
+            return False
+        if error is not None:
+            return isinstance(error, (requests.ConnectionError, requests.Timeout))
+        return res is not None and res.status_code in self.retry_status_codes
+
+    def delay(self, attempt: int, res: Optional[requests.Response] = None) -> float:
+        """Seconds to wait before `attempt + 1`: the server's Retry-After, or exponential backoff."""
+        if self.respect_retry_after and res is not None:
+            retry_after = RetryPolicy._parse_retry_after(res.headers.get("Retry-After"))
+            if retry_after is not None:
+                return retry_after
+
+        backoff = min(
+            self.max_backoff, self.initial_backoff * self.multiplier ** (attempt - 1)
+        )
+        # "Full jitter" spreads retries of concurrent tasks over the whole interval
+        return random.uniform(0, backoff) if self.jitter else backoff
+
+    @staticmethod
+    def _parse_retry_after(value: Optional[str]) -> Optional[float]:
+        if not value:
+            return None
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            pass
+        try:
+            retry_at = parsedate_to_datetime(value)
+        except (TypeError, ValueError):
+            return None
+        if retry_at.tzinfo is None:
+            retry_at = retry_at.replace(tzinfo=timezone.utc)
+        return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
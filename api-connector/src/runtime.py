@@ -0,0 +1,44 @@
+# Copyright 2022 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import contextvars
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Optional
+
+from .config import config
+
+
+class Background:
+    """Shared thread pool for blocking I/O that can overlap with the rest of a request."""
+
+    _lock = threading.Lock()
+    _executor: Optional[ThreadPoolExecutor] = None
+
+    @staticmethod
+    def executor() -> ThreadPoolExecutor:
+        if Background._executor is None:
+            with Background._lock:
+                if Background._executor is None:
+                    Background._executor = ThreadPoolExecutor(
+                        max_workers=config.IO_WORKERS, thread_name_prefix="io"
+                    )
+        return Background._executor
+
+    @staticmethod
+    def submit(fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Future:
+        # Background work runs in the caller's context (e.g. its current tracing span)
+        context = contextvars.copy_context()
+        return Background.executor().submit(context.run, fn, *args, **kwargs)
+
@@ -0,0 +1,132 @@
+# Copyright 2022 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import threading
+import time
+from http.cookiejar import DefaultCookiePolicy
+from typing import Any, Dict, Tuple
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+from .config import config
+from .logger import logger
+from .metrics import Metrics
+
+# Connection setup times of the request currently running on this thread
+_timing = threading.local()
+
+
+class _TimedConnectionMixin:
+    def _new_conn(self):
+        start = time.perf_counter()
+        try:
+            return super()._new_conn()  # type: ignore
+        finally:
+            self._tcp_time = time.perf_counter() - start
+
+    def connect(self):
+        self._tcp_time = 0.0
+        start = time.perf_counter()
+        super().connect()  # type: ignore
+        total = time.perf_counter() - start
+
+        _timing.connect = getattr(_timing, "connect", 0.0) + self._tcp_time
+        _timing.tls = getattr(_timing, "tls", 0.0) + max(0.0, total - self._tcp_time)
+        Metrics.increment("http.connections.opened")
+
+
+class _TimedHTTPConnection(_TimedConnectionMixin, HTTPConnection):
+    pass
+
+
+class _TimedHTTPSConnection(_TimedConnectionMixin, HTTPSConnection):
+    pass
+
+
+class _TimedHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = _TimedHTTPConnection
+
+
+class _TimedHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = _TimedHTTPSConnection
+
+
+class _TimedHTTPAdapter(HTTPAdapter):
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": _TimedHTTPConnectionPool,
+            "https": _TimedHTTPSConnectionPool,
+        }
+
+
+class Sessions:
+    """
+    Keep-alive `requests.Session` per upstream host, reused across warm invocations so
+    repeated calls to the same API skip the TCP and TLS handshakes.
+    """
+
+    SUPPORTED_METHODS = ["get", "post", "put", "patch", "delete", "head"]
+
+    _lock = threading.Lock()
+    _sessions: Dict[str, requests.Session] = {}
+
+    @staticmethod
+    def get(uri: str) -> requests.Session:
+        parts = urlsplit(uri)
+        host = f"{parts.scheme}://{parts.netloc}"
+
+        session = Sessions._sessions.get(host)
+        if session is not None:
+            return session
+
+        with Sessions._lock:
+            session = Sessions._sessions.get(host)
+            if session is None:
+                session = requests.Session()
+                # Sessions are shared by unrelated tasks, so cookies must not leak between them
+                session.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+
+                adapter = _TimedHTTPAdapter(
+                    pool_connections=1, pool_maxsize=config.HTTP_POOL_SIZE
+                )
+                session.mount("http://", adapter)
+                session.mount("https://", adapter)
+
+                logger.debug("Created HTTP session for '%s'.", host)
+                Sessions._sessions[host] = session
+        return session
+
+    @staticmethod
+    def request(method: str, uri: str, **kwargs: Any) -> Tuple[requests.Response, Dict[str, float]]:
+        """
+        Sends the request through the host's pooled session and returns the response
+        together with the time spent on the TCP connect, the TLS handshake and the server.
+        """
+        _timing.connect = 0.0
+        _timing.tls = 0.0
+
+        res = Sessions.get(uri).request(method.upper(), uri, **kwargs)
+
+        elapsed = res.elapsed.total_seconds()
+        timing = {
+            "connect_time": _timing.connect,
+            "tls_time": _timing.tls,
+            "server_time": max(0.0, elapsed - _timing.connect - _timing.tls),
+        }
+        return res, timing
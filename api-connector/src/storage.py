@@ -0,0 +1,55 @@
+# Copyright 2022 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import shutil
+from typing import IO
+
+from .clients import Clients
+from .config import config
+from .logger import logger
+
+
+class Storage:
+    """
+    Writes large response bodies to `LOD_GCS_STAGING`, which is either a
+    `gs://bucket[/prefix]` URL or, when running locally, a directory.
+    """
+
+    @staticmethod
+    def upload(file: IO[bytes], object_name: str, content_type: str = None) -> str:
+        staging = config.LOD_GCS_STAGING
+        if not staging:
+            raise KeyError("Environment variable 'LOD_GCS_STAGING' must be set.")
+
+        if not staging.startswith("gs://"):
+            path = os.path.join(staging, object_name)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, "wb") as out:
+                shutil.copyfileobj(file, out)
+            return path
+
+        from google.api_core.exceptions import PreconditionFailed
+
+        bucket_name, _, prefix = staging[len("gs://") :].partition("/")
+        blob_name = "/".join(filter(None, [prefix.strip("/"), object_name]))
+        blob = Clients.storage().bucket(bucket_name).blob(blob_name)
+
+        try:
+            # Object names are content addressed: an existing object already has this body
+            blob.upload_from_file(file, content_type=content_type, if_generation_match=0)
+        except PreconditionFailed:
+            logger.debug("Object 'gs://%s/%s' already exists.", bucket_name, blob_name)
+
+        return f"gs://{bucket_name}/{blob_name}"
@@ -0,0 +1,54 @@
+# Copyright 2022 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import threading
+import time
+from typing import Any, Dict, Tuple
+
+from .clients import Clients
+from .config import config
+from .logger import logger
+from .metrics import Metrics
+
+
+class TableCache:
+    """
+    Process-wide TTL cache of BigQuery table metadata (reference and schema), so
+    streaming inserts don't need a `get_table` round trip on every write.
+    """
+
+    _lock = threading.Lock()
+    _entries: Dict[str, Tuple[float, Any]] = {}
+
+    @staticmethod
+    def get(table_id: str, ttl: float = config.BQ_TABLE_CACHE_TTL) -> Any:
+        now = time.monotonic()
+        entry = TableCache._entries.get(table_id)
+        if entry and now - entry[0] < ttl:
+            Metrics.increment("table_cache.hit")
+            return entry[1]
+
+        Metrics.increment("table_cache.miss")
+        table = Clients.bigquery().get_table(table_id)
+
+        with TableCache._lock:
+            TableCache._entries[table_id] = (now, table)
+        return table
+
+    @staticmethod
+    def invalidate(table_id: str):
+        with TableCache._lock:
+            if TableCache._entries.pop(table_id, None):
+                Metrics.increment("table_cache.invalidated")
+                logger.debug("Invalidated cached metadata for '%s'.", table_id)
@@ -0,0 +1,69 @@
+# Copyright 2022 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import json
+from datetime import datetime, timedelta, timezone
+from typing import TYPE_CHECKING, Any, Optional
+
+from .clients import Clients
+from .config import config
+from .logger import logger
+from .tracing import Tracer
+
+if TYPE_CHECKING:
+    from google.cloud import tasks_v2
+
+
+class Tasks:
+    @staticmethod
+    def function_uri() -> str:
+        return f"https://{config.REGION}-{config.PROJECT_ID}.cloudfunctions.net/{config.FUNCTION_NAME}"
+
+    @staticmethod
+    def enqueue(queue_name: str, payload: Any, delay: Optional[float] = None) -> "tasks_v2.Task":
+        """
+        Creates a Cloud Task that calls this function back with the given payload,
+        dispatched no earlier than `delay` seconds from now when set.
+        """
+        from google.cloud import tasks_v2
+
+        dispatch_time = datetime.now(timezone.utc) + timedelta(seconds=delay or 0)
+        if payload:
+            # Lets the handler measure how long the task waited in the queue
+            payload = {**payload, "enqueued_at": dispatch_time.isoformat()}
+
+        task_descriptor = tasks_v2.Task(
+            http_request=tasks_v2.HttpRequest(
+                http_method=tasks_v2.HttpMethod.POST,
+                url=Tasks.function_uri(),
+                # The trace context flows from the enqueuing invocation to the task's
+                headers={"Content-type": "application/json", **Tracer.headers()},
+                body=json.dumps(payload).encode() if payload else None,
+            )
+        )
+
+        if delay:
+            task_descriptor.schedule_time = dispatch_time
+
+        logger.debug("Creating task in '%s': %s", queue_name, task_descriptor)
+
+        task = Clients.tasks().create_task(
+            request={
+                "parent": queue_name,
+                "task": task_descriptor,
+            }
+        )
+        logger.info("Created task: %s", task.name)
+
+        return task
@@ -0,0 +1,144 @@
+# Copyright 2022 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import contextvars
+import json
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+from .config import config
+
+TRACEPARENT = re.compile(r"^00-([0-9a-f]{32})-([0-9a-f]{16})-[0-9a-f]{2}$")
+
+
+class Span:
+    def __init__(
+        self, name: str, trace_id: str, parent_id: Optional[str], attributes: Dict[str, Any]
+    ):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent_id
+        self.attributes = attributes
+        self.status = "OK"
+        self.start_time = time.time_ns()
+        self.end_time: Optional[int] = None
+
+    def set(self, key: str, value: Any):
+        self.attributes[key] = value
+
+    @property
+    def traceparent(self) -> str:
+        return f"00-{self.trace_id}-{self.span_id}-01"
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_span_id": self.parent_id,
+            "start_time": self.start_time,
+            "end_time": self.end_time,
+            "duration": (self.end_time - self.start_time) / 1e9 if self.end_time else None,
+            "status": self.status,
+            "attributes": self.attributes,
+        }
+
+
+class FileExporter:
+    """Appends finished spans to a local file, one JSON object per line."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def __call__(self, span: Dict[str, Any]):
+        line = json.dumps(span, default=str) + "\n"
+        with self._lock:
+            with open(self.path, "a") as file:
+                file.write(line)
+
+
+class Tracer:
+    """
+    Minimal span tracer with W3C `traceparent` propagation. The current span is
+    kept in a context variable, local to each request's thread; work submitted to
+    thread pools must be wrapped with `Tracer.wrap` to keep its parent.
+    """
+
+    _current: contextvars.ContextVar[Optional[Span]] = contextvars.ContextVar(
+        "span", default=None
+    )
+    _exporters: List[Callable[[Dict[str, Any]], None]] = (
+        [FileExporter(config.TRACE_EXPORT_PATH)] if config.TRACE_EXPORT_PATH else []
+    )
+
+    @staticmethod
+    def add_exporter(exporter: Callable[[Dict[str, Any]], None]):
+        Tracer._exporters.append(exporter)
+
+    @staticmethod
+    @contextmanager
+    def span(name: str, traceparent: Optional[str] = None, **attributes: Any) -> Iterator[Span]:
+        """
+        Starts a span, child of the current one or, for the first span of an
+        invocation, of the remote parent given as a `traceparent` header.
+        """
+        parent = Tracer._current.get()
+        if parent is not None:
+            trace_id, parent_id = parent.trace_id, parent.span_id
+        else:
+            match = TRACEPARENT.match(traceparent or "")
+            trace_id, parent_id = match.groups() if match else (os.urandom(16).hex(), None)
+
+        span = Span(name, trace_id, parent_id, attributes)
+        token = Tracer._current.set(span)
+        try:
+            yield span
+        except Exception as e:
+            span.status = "ERROR"
+            span.set("error", str(e))
+            raise
+        finally:
+            span.end_time = time.time_ns()
+            Tracer._current.reset(token)
+            Tracer._export(span)
+
+    @staticmethod
+    def current() -> Optional[Span]:
+        return Tracer._current.get()
+
+    @staticmethod
+    def headers() -> Dict[str, str]:
+        """Headers propagating the current span to a downstream invocation."""
+        span = Tracer._current.get()
+        return {"traceparent": span.traceparent} if span else {}
+
+    @staticmethod
+    def wrap(fn: Callable[..., Any]) -> Callable[..., Any]:
+        """Binds `fn` to the current span, for functions run on other threads."""
+        context = contextvars.copy_context()
+        return lambda *args, **kwargs: context.copy().run(fn, *args, **kwargs)
+
+    @staticmethod
+    def _export(span: Span):
+        if not Tracer._exporters:
+            return
+        record = span.to_dict()
+        for exporter in Tracer._exporters:
+            exporter(record)
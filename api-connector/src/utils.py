@@ -12,12 +12,13 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-from typing import Any
-
-from google.cloud import bigquery
+from typing import Any, List
 
+from .clients import Clients
 from .config import config
 from .logger import logger
+from .table_cache import TableCache
+from .tracing import Tracer
 
 
 class Utils:
@@ -29,19 +30,47 @@ class Utils:
         return val
 
     @staticmethod
-    def save_bigquery(dataset_and_table, data, project_id=config.PROJECT_ID):
-        logger.debug(f"Attempting to write to table '{dataset_and_table}'")
+    def save_bigquery(dataset_and_table, data, project_id=None):
+        return not Utils.insert_rows(dataset_and_table, [data], project_id)[0]
+
+    @staticmethod
+    def insert_rows(
+        dataset_and_table,
+        rows: List[Any],
+        project_id=None,
+        fetch_schema=config.BQ_FETCH_TABLE_SCHEMA,
+    ) -> List[List[Any]]:
+        """
+        Writes `rows` with a single streaming insert and returns the errors of each
+        row, in the same order as `rows` (an empty list means the row was written).
+        With `fetch_schema=False` the rows are inserted by table ID only.
+        """
+        with Tracer.span("bigquery.insert_rows", table=dataset_and_table, rows=len(rows)) as span:
+            logger.debug(
+                "Attempting to write %s row(s) to table '%s'", len(rows), dataset_and_table
+            )
+
+            table_id = f"{project_id or config.PROJECT_ID}.{dataset_and_table}"
+            table = TableCache.get(table_id) if fetch_schema else table_id
 
-        client = bigquery.Client()
-        table = client.get_table(f"{project_id}.{dataset_and_table}")
-        rows = [data]
+            try:
+                errors = Clients.bigquery().insert_rows_json(table, rows)
+            except Exception:
+                TableCache.invalidate(table_id)
+                raise
 
-        errors = client.insert_rows_json(table, rows)
+            # A rejected row usually means the table changed since it was cached
+            if any(e.get("reason") == "invalid" for error in errors for e in error["errors"]):
+                TableCache.invalidate(table_id)
 
-        if errors:
-            logger.error(f"Errors: {errors}")
-            return False
+            row_errors: List[List[Any]] = [[] for _ in rows]
+            for error in errors:
+                row_errors[error["index"]].extend(error["errors"])
 
-        logger.debug("Success.")
+            if errors:
+                span.set("failed_rows", len(errors))
+                logger.error("Errors: %s", errors)
+            else:
+                logger.debug("Success.")
 
-        return True
+            return row_errors
@@ -0,0 +1,96 @@
+# Copyright 2022 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import json
+import threading
+from typing import Any, Dict, List
+
+from .config import config
+from .logger import logger
+from .utils import Utils
+
+
+class BigQueryWriter:
+    """
+    Buffers rows per destination table and sends each table's rows in a single
+    streaming insert. A table is flushed when it reaches `max_rows` or `max_bytes`,
+    and every table is flushed when the writer is closed (or leaves a `with` block).
+    """
+
+    def __init__(
+        self,
+        max_rows: int = config.BQ_MAX_BATCH_ROWS,
+        max_bytes: int = config.BQ_MAX_BATCH_BYTES,
+    ):
+        self.max_rows = max_rows
+        self.max_bytes = max_bytes
+        self.failures: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+        self._rows: Dict[str, List[Any]] = {}
+        self._bytes: Dict[str, int] = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.flush()
+
+    def add(self, dataset_and_table: str, row: Any):
+        size = len(json.dumps(row, default=str))
+        ready = None
+
+        with self._lock:
+            if self._rows.get(dataset_and_table) and (
+                self._bytes[dataset_and_table] + size > self.max_bytes
+            ):
+                ready = self._take(dataset_and_table)
+
+            self._rows.setdefault(dataset_and_table, []).append(row)
+            self._bytes[dataset_and_table] = self._bytes.get(dataset_and_table, 0) + size
+
+            if ready is None and len(self._rows[dataset_and_table]) >= self.max_rows:
+                ready = self._take(dataset_and_table)
+
+        if ready:
+            self._send(dataset_and_table, ready)
+
+    def flush(self) -> List[Dict[str, Any]]:
+        """Sends every buffered row and returns the rows that failed since the last flush."""
+        with self._lock:
+            pending = {table: self._take(table) for table in list(self._rows.keys())}
+            reported = len(self.failures)
+
+        for table, rows in pending.items():
+            if rows:
+                self._send(table, rows)
+
+        return self.failures[reported:]
+
+    def _take(self, dataset_and_table: str) -> List[Any]:
+        self._bytes[dataset_and_table] = 0
+        return self._rows.pop(dataset_and_table, [])
+
+    def _send(self, dataset_and_table: str, rows: List[Any]):
+        try:
+            row_errors = Utils.insert_rows(dataset_and_table, rows)
+        except Exception as e:
+            logger.error("Failed to write %s row(s) to '%s': %s", len(rows), dataset_and_table, e)
+            row_errors = [[{"reason": "exception", "message": str(e)}]] * len(rows)
+
+        with self._lock:
+            for row, errors in zip(rows, row_errors):
+                if errors:
+                    self.failures.append(
+                        {"table": dataset_and_table, "row": row, "errors": errors}
+                    )
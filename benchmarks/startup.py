@@ -0,0 +1,202 @@
+# Copyright 2022 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Cold start benchmark for the Cloud Functions of this repository.
+
+Each run starts a fresh interpreter with `-X importtime`, loads the function's
+`main.py` the way functions-framework does, and times its first and second
+request. Google Cloud clients are replaced by stubs, so no credentials or
+network access are needed, but the client libraries used by the request path
+are still imported.
+
+    python benchmarks/startup.py --runs 5 --output startup.json
+    python benchmarks/startup.py --baseline startup.json --tolerance 0.2
+
+With `--baseline`, the exit code is 1 when a median import or first request
+time is more than `tolerance` slower than the baseline.
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from typing import Any, Dict, List
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+FUNCTIONS = {
+    "api-connector": os.path.join(ROOT, "api-connector"),
+    "workflow1": os.path.join(ROOT, "workflow-postprocess", "workflow1"),
+}
+
+# Runs in the child interpreter: argv[1] is the function's directory, argv[2] its name
+CHILD = r"""
+import importlib.util
+import json
+import sys
+import time
+
+directory, name = sys.argv[1], sys.argv[2]
+
+started = time.perf_counter()
+sys.path.insert(0, directory)
+spec = importlib.util.spec_from_file_location(
+    "main", f"{directory}/main.py", submodule_search_locations=[directory]
+)
+module = importlib.util.module_from_spec(spec)
+sys.modules["main"] = module
+spec.loader.exec_module(module)
+import_time = time.perf_counter() - started
+
+import flask
+
+body = {}
+if name == "api-connector":
+    from main.src.clients import Clients
+
+    class Stub:
+        # Accepts any call, and returns itself or an empty result
+        def __getattr__(self, attr):
+            return self
+
+        def __call__(self, *args, **kwargs):
+            return self
+
+        def insert_rows_json(self, table, rows):
+            return []
+
+    Clients._instances.update({"tasks": Stub(), "bigquery": Stub()})
+    body = {
+        "calls": [
+            [
+                "workflow1",
+                '{"uri": "https://example.com", "method": "GET"}',
+                "{}",
+                "{}",
+                '{"q": "1"}',
+                "{}",
+                "dataset.tbl_result_benchmark",
+                "projects/benchmark/locations/region/queues/benchmark",
+            ]
+        ]
+    }
+
+app = flask.Flask("benchmark")
+timings = []
+for _ in range(2):
+    with app.test_request_context(json=body):
+        started = time.perf_counter()
+        module.main(flask.request)
+        timings.append(time.perf_counter() - started)
+
+print(
+    json.dumps(
+        {"import_time": import_time, "first_request": timings[0], "warm_request": timings[1]}
+    )
+)
+"""
+
+
+def parse_importtime(stderr: str, top: int) -> List[Dict[str, Any]]:
+    """Heaviest imports by cumulative time, from `-X importtime` output."""
+    imports = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "imported package" in line:
+            continue
+        self_us, cumulative_us, package = line[len("import time:") :].split("|")
+        imports.append(
+            {
+                "module": package.strip(),
+                "self": int(self_us) / 1e6,
+                "cumulative": int(cumulative_us) / 1e6,
+            }
+        )
+    return sorted(imports, key=lambda i: i["cumulative"], reverse=True)[:top]
+
+
+def run(name: str, directory: str, env: Dict[str, str], top: int) -> Dict[str, Any]:
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", CHILD, directory, name],
+        capture_output=True,
+        text=True,
+        env=env,
+        cwd=directory,
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(f"'{name}' failed to start:\n{proc.stderr[-2000:]}")
+
+    result = json.loads(proc.stdout.strip().splitlines()[-1])
+    result["top_imports"] = parse_importtime(proc.stderr, top)
+    return result
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--runs", type=int, default=5, help="Fresh interpreters per function.")
+    parser.add_argument("--top", type=int, default=15, help="Heaviest imports to report.")
+    parser.add_argument(
+        "--function", choices=sorted(FUNCTIONS), action="append", help="Only benchmark these."
+    )
+    parser.add_argument("--environment", default="production", help="Functions' ENVIRONMENT.")
+    parser.add_argument("--output", help="Also write the results to this file.")
+    parser.add_argument("--baseline", help="Results of a previous run to compare against.")
+    parser.add_argument(
+        "--tolerance", type=float, default=0.2, help="Allowed slowdown over the baseline."
+    )
+    args = parser.parse_args()
+
+    env = dict(os.environ, PROJECT_ID="benchmark", REGION="region", FUNCTION_NAME="benchmark")
+    env["ENVIRONMENT"] = args.environment
+    env["RUN_METRICS"] = "false"
+
+    results: Dict[str, Any] = {}
+    for name in args.function or sorted(FUNCTIONS):
+        runs = [run(name, FUNCTIONS[name], env, args.top) for _ in range(args.runs)]
+        results[name] = {
+            metric: statistics.median(r[metric] for r in runs)
+            for metric in ("import_time", "first_request", "warm_request")
+        }
+        results[name]["runs"] = args.runs
+        results[name]["top_imports"] = runs[-1]["top_imports"]
+
+    print(json.dumps(results, indent=2))
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(results, file, indent=2)
+
+    if not args.baseline:
+        return 0
+
+    with open(args.baseline) as file:
+        baseline = json.load(file)
+
+    regressions = [
+        f"{name} {metric}: {results[name][metric]:.3f}s (baseline {baseline[name][metric]:.3f}s)"
+        for name in results
+        if name in baseline
+        for metric in ("import_time", "first_request")
+        if results[name][metric] > baseline[name][metric] * (1 + args.tolerance)
+    ]
+    for regression in regressions:
+        print(f"Regression: {regression}", file=sys.stderr)
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
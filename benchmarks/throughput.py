@@ -0,0 +1,448 @@
+# Copyright 2022 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+End-to-end throughput benchmark for the api-connector.
+
+Each scenario sends its source rows to the function as BigQuery Routine calls
+and runs every Cloud Task it enqueues, with every dependency replaced by a
+local stand-in:
+
+- the upstream API is an in-process HTTP server with configurable latency,
+  error rate and response size, and an OAuth 2.0 token endpoint
+- BigQuery, Secret Manager and Pub/Sub are in-memory fakes
+- Cloud Tasks is a queue drained by worker threads, which call the function
+  back like Cloud Tasks does (one worker per concurrent request)
+- large responses are offloaded to a temporary directory
+
+Each scenario runs in a fresh interpreter, so peak RSS is its own.
+
+    python benchmarks/throughput.py --output throughput.json
+    python benchmarks/throughput.py --scenario rows_10k --rows 2000 --no-tracemalloc
+"""
+
+import argparse
+import importlib.util
+import json
+import math
+import os
+import platform
+import queue
+import random
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+from typing import Any, Dict, List
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FUNCTION_DIR = os.path.join(ROOT, "api-connector")
+
+WORKFLOW_ID = "benchmark"
+RESULT_TABLE = "benchmark.tbl_result_benchmark"
+QUEUE_NAME = "projects/benchmark/locations/local/queues/benchmark"
+
+# Rows per BigQuery Routine call, as set by max_batching_rows
+ROUTINE_BATCH_ROWS = 50
+
+SCENARIOS: Dict[str, Dict[str, Any]] = {
+    "rows_10k": {"rows": 10000, "latency": 0.005, "size": 512},
+    "micro_batched": {"rows": 10000, "latency": 0.005, "size": 512, "rows_per_task": 20},
+    "direct_dispatch": {"rows": 2000, "latency": 0.005, "size": 512, "dispatch_mode": "direct"},
+    "large_responses": {"rows": 200, "latency": 0.01, "size": 4 * 1024 * 1024},
+    "client_credentials": {"rows": 2000, "latency": 0.005, "size": 1024, "auth": "CLIENT_CREDENTIALS"},
+    "errors_and_retries": {
+        "rows": 2000,
+        "latency": 0.005,
+        "size": 512,
+        "error_rate": 0.1,
+        "retry": {"max_attempts": 3, "initial_backoff": 0.01, "max_backoff": 0.05},
+    },
+}
+
+
+def percentile(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(q * (len(values) - 1))))]
+
+
+class Upstream:
+    """In-process HTTP API: `/data` answers after `latency` seconds, `/token` issues tokens."""
+
+    def __init__(self, latency: float, error_rate: float, size: int):
+        body = json.dumps({"items": [], "padding": "x" * max(0, size - 30)}).encode("utf-8")
+        token = json.dumps({"access_token": "benchmark", "expires_in": 3600}).encode("utf-8")
+        self.calls = 0
+        upstream = self
+
+        class RequestHandler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            # Headers and body are separate writes: with Nagle's algorithm, the body would
+            # wait for the client's delayed ACK (~40 ms) on every call
+            disable_nagle_algorithm = True
+
+            def log_message(self, *args):
+                pass
+
+            def _reply(self, status: int, payload: bytes):
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def do_GET(self):
+                upstream.calls += 1
+                time.sleep(random.uniform(0.5, 1.5) * latency)
+                if random.random() < error_rate:
+                    self._reply(503, b'{"error": "unavailable"}')
+                else:
+                    self._reply(200, body)
+
+            def do_POST(self):
+                self.rfile.read(int(self.headers.get("Content-Length") or 0))
+                self._reply(200, token)
+
+        class Server(ThreadingHTTPServer):
+            # The default backlog of 5 drops connections opened at once by many workers,
+            # which then wait for a SYN retransmit (1 s or more)
+            request_queue_size = 1024
+
+        self.server = Server(("127.0.0.1", 0), RequestHandler)
+        self.server.daemon_threads = True
+        self.uri = f"http://127.0.0.1:{self.server.server_address[1]}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
+
+
+class FakeBigQuery:
+    """Accepts streaming inserts; rows are serialised like the real client, then counted."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.rows: Dict[str, int] = {}
+        self.bytes = 0
+        self.inserts = 0
+
+    def get_table(self, table_id: str) -> str:
+        return table_id
+
+    def insert_rows_json(self, table: Any, rows: List[Any]) -> List[Any]:
+        size = len(json.dumps(rows))
+        name = str(table).rsplit(".", 1)[-1].rsplit("_", 1)[0]
+        with self.lock:
+            self.rows[name] = self.rows.get(name, 0) + len(rows)
+            self.bytes += size
+            self.inserts += 1
+        return []
+
+
+class FakeSecretManager:
+    def __init__(self, secrets: Dict[str, Any]):
+        self.secrets = secrets
+
+    def access_secret_version(self, name: str) -> Any:
+        data = json.dumps(self.secrets[name]).encode("utf-8")
+        return SimpleNamespace(payload=SimpleNamespace(data=data))
+
+
+class FakePublisher:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.messages = 0
+        self.bytes = 0
+
+    def publish(self, topic: str, data: bytes, ordering_key: str = "", **attributes: str) -> Future:
+        with self.lock:
+            self.messages += 1
+            self.bytes += len(data)
+        future: Future = Future()
+        future.set_result(str(self.messages))
+        return future
+
+    def resume_publish(self, topic: str, ordering_key: str):
+        pass
+
+
+class FakeTasks:
+    """Cloud Tasks queue whose tasks are dispatched back to the function by `workers` threads."""
+
+    def __init__(self, function: Any, workers: int):
+        self.function = function
+        self.tasks: "queue.Queue[Any]" = queue.Queue()
+        self.latencies: List[float] = []
+        self.failures = 0
+        self.created = 0
+        self.lock = threading.Lock()
+        for _ in range(workers):
+            threading.Thread(target=self._work, daemon=True).start()
+
+    def create_task(self, request: Dict[str, Any]) -> Any:
+        task = request["task"]
+        with self.lock:
+            self.created += 1
+            name = f"{request['parent']}/tasks/{self.created}"
+        delay = 0.0
+        if task.schedule_time:
+            delay = max(0.0, task.schedule_time.timestamp() - time.time())
+        self.tasks.put(
+            (
+                time.monotonic() + delay,
+                json.loads(task.http_request.body),
+                dict(task.http_request.headers),
+            )
+        )
+        return SimpleNamespace(name=name)
+
+    def _work(self):
+        while True:
+            (due, payload, headers) = self.tasks.get()
+            try:
+                wait = due - time.monotonic()
+                if wait > 0:
+                    time.sleep(wait)
+                started = time.perf_counter()
+                (_, code) = self.function(payload, headers)
+                with self.lock:
+                    self.latencies.append(time.perf_counter() - started)
+                    self.failures += code >= 500
+            finally:
+                self.tasks.task_done()
+
+
+def load_function() -> Any:
+    """Loads api-connector's main.py the way functions-framework does."""
+    sys.path.insert(0, FUNCTION_DIR)
+    spec = importlib.util.spec_from_file_location(
+        "main", os.path.join(FUNCTION_DIR, "main.py"), submodule_search_locations=[FUNCTION_DIR]
+    )
+    module = importlib.util.module_from_spec(spec)  # type: ignore
+    sys.modules["main"] = module
+    spec.loader.exec_module(module)  # type: ignore
+    return module
+
+
+def run_scenario(settings: Dict[str, Any], workers: int, trace: bool) -> Dict[str, Any]:
+    import flask
+
+    module = load_function()
+    from main.src.clients import Clients
+
+    upstream = Upstream(settings["latency"], settings.get("error_rate", 0.0), settings["size"])
+    secrets = {
+        "projects/benchmark/secrets/basic/versions/1": {"username": "user", "password": "pass"},
+        "projects/benchmark/secrets/oauth/versions/1": {"client_secret": "secret"},
+    }
+    if settings.get("auth") == "CLIENT_CREDENTIALS":
+        auth = {
+            "type": "CLIENT_CREDENTIALS",
+            "secret_name": "projects/benchmark/secrets/oauth/versions/1",
+            "auth_server": f"{upstream.uri}/token",
+            "client_id": "benchmark",
+        }
+    else:
+        auth = {"type": "HTTP_BASIC", "secret_name": "projects/benchmark/secrets/basic/versions/1"}
+
+    request_config = {"uri": f"{upstream.uri}/data", "method": "GET", "timeout": 30}
+    for key in ("rows_per_task", "dispatch_mode", "retry"):
+        if key in settings:
+            request_config[key] = settings[key]
+
+    app = flask.Flask("benchmark")
+
+    def call(payload: Any, headers: Dict[str, str]) -> Any:
+        with app.test_request_context(json=payload, headers=headers):
+            res = module.main(flask.request)
+            return res if isinstance(res, tuple) else (res, 200)
+
+    bigquery, publisher = FakeBigQuery(), FakePublisher()
+    tasks = FakeTasks(call, workers)
+    Clients._instances.update(
+        {
+            "bigquery": bigquery,
+            "tasks": tasks,
+            "secret_manager": FakeSecretManager(secrets),
+            "publisher": publisher,
+        }
+    )
+
+    rows = settings["rows"]
+    calls = [
+        [
+            WORKFLOW_ID,
+            json.dumps(request_config),
+            json.dumps(auth),
+            json.dumps({"Accept": "application/json"}),
+            json.dumps({"id": str(i)}),
+            json.dumps({}),
+            RESULT_TABLE,
+            QUEUE_NAME,
+        ]
+        for i in range(rows)
+    ]
+    batches = [calls[i : i + ROUTINE_BATCH_ROWS] for i in range(0, rows, ROUTINE_BATCH_ROWS)]
+    routine_latencies: List[float] = []
+    errors: List[str] = []
+    expected_tasks = 0
+    if settings.get("dispatch_mode") != "direct":
+        # Each routine batch is split into tasks of up to `rows_per_task` rows
+        per_task = settings.get("rows_per_task", 1)
+        expected_tasks = sum(math.ceil(len(batch) / per_task) for batch in batches)
+
+    def routine(batch: List[Any]):
+        started = time.perf_counter()
+        (res, code) = call({"calls": batch}, {})
+        routine_latencies.append(time.perf_counter() - started)
+        if code != 200:
+            errors.append(f"Routine call failed with {code}: {res.get_data(as_text=True)}")
+            return
+        for reply in json.loads(res.get_data(as_text=True))["replies"]:
+            if isinstance(reply, dict) and "error" in reply:
+                errors.append(str(reply["error"]))
+
+    if trace:
+        tracemalloc.start()
+    started = time.perf_counter()
+
+    # BigQuery calls the remote function with a few batches in flight
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        list(executor.map(routine, batches))
+    tasks.tasks.join()
+
+    elapsed = time.perf_counter() - started
+    traced_peak = tracemalloc.get_traced_memory()[1] if trace else None
+    if trace:
+        tracemalloc.stop()
+    upstream.close()
+
+    # Throughput only counts if every source row was queued (or called) and reached the API
+    if tasks.created < expected_tasks:
+        errors.append(f"{tasks.created} tasks created, {expected_tasks} expected.")
+    if tasks.failures:
+        errors.append(f"{tasks.failures} tasks failed.")
+    if upstream.calls < rows:
+        errors.append(f"{upstream.calls} upstream calls for {rows} rows.")
+
+    return {
+        "settings": settings,
+        "workers": workers,
+        "valid": not errors,
+        "errors": errors[:10],
+        "error_count": len(errors),
+        "rows": rows,
+        "elapsed": elapsed,
+        "rows_per_second": rows / elapsed,
+        "upstream_calls": upstream.calls,
+        "tasks": tasks.created,
+        "task_failures": tasks.failures,
+        "task_latency": {
+            "p50": percentile(tasks.latencies, 0.5),
+            "p99": percentile(tasks.latencies, 0.99),
+            "mean": statistics.fmean(tasks.latencies) if tasks.latencies else 0.0,
+        },
+        "routine_latency": {
+            "p50": percentile(routine_latencies, 0.5),
+            "p99": percentile(routine_latencies, 0.99),
+        },
+        "bigquery": {"rows": bigquery.rows, "bytes": bigquery.bytes, "inserts": bigquery.inserts},
+        "pubsub": {"messages": publisher.messages, "bytes": publisher.bytes},
+        "traced_peak_bytes": traced_peak,
+        # ru_maxrss is in kilobytes on Linux
+        "peak_rss_bytes": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024,
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--scenario", choices=sorted(SCENARIOS), action="append")
+    parser.add_argument("--rows", type=int, help="Overrides the number of rows of every scenario.")
+    parser.add_argument("--workers", type=int, default=16, help="Concurrent Cloud Task requests.")
+    parser.add_argument(
+        "--no-tracemalloc", action="store_true", help="Skip allocation tracing (it slows runs down)."
+    )
+    parser.add_argument("--output", help="Also write the results to this file.")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        settings = json.loads(args.child)
+        settings.pop("name")
+        result = run_scenario(settings, args.workers, not args.no_tracemalloc)
+        print(json.dumps(result))
+        return 0
+
+    results: Dict[str, Any] = {
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "scenarios": {},
+    }
+    for name in args.scenario or list(SCENARIOS):
+        settings = dict(SCENARIOS[name], name=name)
+        if args.rows:
+            settings["rows"] = args.rows
+
+        with tempfile.TemporaryDirectory() as staging:
+            env = dict(
+                os.environ,
+                PROJECT_ID="benchmark",
+                REGION="local",
+                FUNCTION_NAME="api-connector",
+                ENVIRONMENT="production",
+                LOD_GCS_STAGING=staging,
+                PUBSUB_TOPICS=json.dumps([{WORKFLOW_ID: "projects/benchmark/topics/benchmark"}]),
+            )
+            command = [sys.executable, __file__, "--child", json.dumps(settings)]
+            command += ["--workers", str(args.workers)]
+            if args.no_tracemalloc:
+                command.append("--no-tracemalloc")
+            proc = subprocess.run(command, capture_output=True, text=True, env=env)
+
+        if proc.returncode != 0:
+            print(f"Scenario '{name}' failed:\n{proc.stderr[-4000:]}", file=sys.stderr)
+            return 1
+        results["scenarios"][name] = json.loads(proc.stdout.strip().splitlines()[-1])
+        summary = results["scenarios"][name]
+        print(
+            f"{name}: {summary['rows_per_second']:.0f} rows/s, "
+            f"p50 {summary['task_latency']['p50'] * 1000:.1f} ms, "
+            f"p99 {summary['task_latency']['p99'] * 1000:.1f} ms, "
+            f"peak RSS {summary['peak_rss_bytes'] / 2**20:.0f} MiB",
+            file=sys.stderr,
+        )
+        if not summary["valid"]:
+            print(f"Scenario '{name}' is not valid: {summary['errors']}", file=sys.stderr)
+
+    print(json.dumps(results, indent=2))
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(results, file, indent=2)
+    return 0 if all(summary["valid"] for summary in results["scenarios"].values()) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
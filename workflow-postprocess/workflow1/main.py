@@ -12,8 +12,6 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-import traceback
-
 import flask
 import flask.typing
 import functions_framework
@@ -28,5 +26,5 @@ def main(request: flask.Request) -> flask.typing.ResponseReturnValue:
         (msg, code) = Handler.execute(request)
         return flask.Response(msg + "\n"), code
     except Exception as e:
-        logger.error(f"Exception occurred: {traceback.format_exception(e)}")
+        logger.error("Exception occurred: %s", e, exc_info=e)
         return flask.Response(f"Exception occurred: {e}"), 500
@@ -15,6 +15,22 @@
 import os
 
 
+class required_env:
+    """
+    A required environment variable, read when first accessed rather than at
+    import, so that a missing variable fails the request that needs it.
+    """
+
+    def __init__(self, key: str):
+        self.key = key
+
+    def __get__(self, instance, owner) -> str:
+        val = os.getenv(self.key)
+        if not val:
+            raise KeyError(f"Environment variable '{self.key}' must be set.")
+        return val
+
+
 class config:
     @staticmethod
     def __env(key: str, required=True):
@@ -23,7 +39,9 @@ class config:
             raise KeyError(f"Environment variable '{key}' must be set.")
         return val
 
-    PROJECT_ID = __env("PROJECT_ID", required=True)
+    PROJECT_ID = required_env("PROJECT_ID")
     FUNCTION_NAME = __env("FUNCTION_NAME", required=False)
     REGION = __env("REGION", required=False)
     ENVIRONMENT = __env("ENVIRONMENT", required=False) or "local"
+    # Log messages are cut after this many characters.
+    LOG_MAX_MESSAGE_LENGTH = int(__env("LOG_MAX_MESSAGE_LENGTH", required=False) or 8192)
@@ -22,5 +22,5 @@ from .logger import logger
 class Handler:
     @staticmethod
     def execute(request: flask.Request) -> Tuple[Any, int]:
-        logger.debug(request)
+        logger.debug("Request: %s", request)
         return "Hello, World!", 200
@@ -12,9 +12,14 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import atexit
+import copy
+import json
 import logging
-
-import coloredlogs
+import queue
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from typing import Any
 
 from .config import config
 
@@ -31,15 +36,86 @@ style = {
     "warning": {"color": "yellow"},
 }
 
-if config.ENVIRONMENT == "local":
-    format = "%(asctime)s %(levelname)-8s %(filename)s:%(lineno)s %(funcName)s -> %(message)s"
-    coloredlogs.install(level="DEBUG", logger=logger, fmt=format, level_styles=style)  # type: ignore
-    logger.info("Running in debugging mode.")
-elif config.ENVIRONMENT == "development":
-    format = "%(levelname)-8s %(filename)s:%(lineno)s %(funcName)s -> %(message)s"
-    coloredlogs.install(level="DEBUG", logger=logger, fmt=format, level_styles=style)  # type: ignore
-    logger.info("Running in debugging mode.")
+
+def truncate(value: Any, limit: int = config.LOG_MAX_MESSAGE_LENGTH) -> str:
+    """Shortens long values (e.g. response bodies) so they are never logged whole."""
+    if isinstance(value, (bytes, bytearray)):
+        value = value[: limit + 1].decode("utf-8", errors="replace")
+    elif not isinstance(value, str):
+        value = str(value)
+    if len(value) > limit:
+        return f"{value[:limit]}... [truncated]"
+    return value
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line, with the fields Cloud Logging recognizes."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "severity": record.levelname,
+            "message": record.getMessage(),
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "logger": record.name,
+            "logging.googleapis.com/sourceLocation": {
+                "file": record.pathname,
+                "line": record.lineno,
+                "function": record.funcName,
+            },
+        }
+        if record.exc_text:
+            entry["message"] += "\n" + record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class LogQueueHandler(QueueHandler):
+    """
+    Hands records over to a background thread that formats and writes them, so a
+    request never waits on the output stream. Only what depends on the request
+    (message arguments, exception) is resolved on its thread.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        record.msg = truncate(record.msg)
+        if isinstance(record.args, tuple):
+            # Numbers are kept as they are, for %d or %.3f placeholders
+            record.args = tuple(
+                arg if isinstance(arg, (int, float)) else truncate(arg)
+                for arg in record.args
+            )
+        record.msg = truncate(record.getMessage())
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+if config.ENVIRONMENT in ("local", "development"):
+    # Human-readable, colored lines to debug; coloredlogs is only imported here
+    import coloredlogs
+
+    if config.ENVIRONMENT == "local":
+        format = "%(asctime)s %(levelname)-8s %(filename)s:%(lineno)s %(funcName)s -> %(message)s"
+    else:
+        format = "%(levelname)-8s %(filename)s:%(lineno)s %(funcName)s -> %(message)s"
+    formatter: logging.Formatter = coloredlogs.ColoredFormatter(fmt=format, level_styles=style)
+    level = logging.DEBUG
 else:
-    format = "%(asctime)s %(name)s %(levelname)s %(message)s"
-    coloredlogs.install(level="INFO", logger=logger, fmt=format, level_styles=style)  # type: ignore
-    logger.info("Running in production mode.")
+    formatter = JsonFormatter()
+    level = logging.INFO
+
+stream = logging.StreamHandler()
+stream.setFormatter(formatter)
+
+records: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+listener = QueueListener(records, stream)
+listener.start()
+# Writes the records still queued when the instance shuts down
+atexit.register(listener.stop)
+
+logger.addHandler(LogQueueHandler(records))
+logger.setLevel(level)
+logger.propagate = False
+logger.info("Running in %s mode.", "debugging" if level == logging.DEBUG else "production")